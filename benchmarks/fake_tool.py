@@ -0,0 +1,332 @@
+"""
+Deterministic stand-in for yt-dlp, svtplay-dl, mpv and ffmpeg.
+
+The same script is installed under every tool name; behaviour is picked from
+the name it was invoked as. Everything is tuned through environment variables
+so a benchmark run is fully reproducible:
+
+    QT_STUB_LATENCY        seconds to sleep before doing any work (default 0)
+    QT_STUB_SIZE           bytes written per downloaded file (default 1 MiB)
+    QT_STUB_FAIL_RATE      0..1, share of URLs that fail (default 0)
+    QT_STUB_FORMATS        number of formats in the info JSON (default 30)
+    QT_STUB_ENTRIES        entries (newest first) for playlist and channel URLs (default 20)
+    QT_STUB_CAPTION_LANGS  automatic caption languages in the info JSON (default 100)
+    QT_STUB_SEED           seed for the failure selection (default "quicktube")
+    QT_STUB_MPV_QUIT_AFTER bytes mpv reads from stdin before quitting (default: all)
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+
+HEIGHTS = [144, 240, 360, 480, 720, 1080, 1440, 2160]
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return int(default)
+
+
+def should_fail(url):
+    """Decide failure from a hash of the URL so reruns fail on the same links."""
+    rate = env_float("QT_STUB_FAIL_RATE", 0)
+    if rate <= 0:
+        return False
+    seed = os.environ.get("QT_STUB_SEED", "quicktube")
+    digest = hashlib.sha256(f"{seed}:{url}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 0xFFFFFFFF < rate
+
+
+def video_id(url):
+    """Return a stable 11 character id for a URL."""
+    match = re.search(r"(?:v=|youtu\.be/|shorts/)([\w-]{11})", url)
+    if match:
+        return match.group(1)
+    return hashlib.md5(url.encode("utf-8")).hexdigest()[:11]
+
+
+def make_format(index):
+    height = HEIGHTS[index % len(HEIGHTS)]
+    is_audio = index % 5 == 4
+    fmt = {
+        "format_id": str(100 + index),
+        "ext": "m4a" if is_audio else ("mp4" if index % 2 else "webm"),
+        "protocol": "https",
+        "url": f"https://stub.invalid/videoplayback?itag={100 + index}&sig={'x' * 200}",
+        "http_headers": {
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) stub",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-us,en;q=0.5",
+            "Sec-Fetch-Mode": "navigate",
+        },
+        "tbr": round(100 + index * 37.5, 3),
+        "filesize": 1_000_000 + index * 250_000 if index % 3 else None,
+        "filesize_approx": 1_100_000 + index * 250_000,
+    }
+    if is_audio:
+        fmt.update({"vcodec": "none", "acodec": "mp4a.40.2", "height": None, "width": None, "fps": None})
+    else:
+        fmt.update({
+            "vcodec": "avc1.64001F" if index % 2 else "vp9",
+            "acodec": "mp4a.40.2" if index % 7 == 0 else "none",
+            "height": height,
+            "width": height * 16 // 9,
+            "fps": 60 if index % 4 == 0 else 30,
+        })
+    return fmt
+
+
+def make_info(url):
+    vid = video_id(url)
+    langs = env_int("QT_STUB_CAPTION_LANGS", 100)
+    captions = {
+        f"l{n:03d}": [
+            {"ext": ext, "url": f"https://stub.invalid/api/timedtext?v={vid}&lang=l{n:03d}&fmt={ext}&{'p' * 150}"}
+            for ext in ("json3", "srv1", "srv2", "srv3", "ttml", "vtt")
+        ]
+        for n in range(langs)
+    }
+    return {
+        "id": vid,
+        "title": f"Stub video {vid}",
+        "duration": 600,
+        "filesize_approx": env_int("QT_STUB_SIZE", 1024 * 1024),
+        "webpage_url": url,
+        "extractor": "youtube",
+        "formats": [make_format(i) for i in range(env_int("QT_STUB_FORMATS", 30))],
+        "thumbnails": [
+            {"url": f"https://stub.invalid/vi/{vid}/{n}.jpg", "preference": -n, "id": str(n)}
+            for n in range(40)
+        ],
+        "automatic_captions": captions,
+        "chapters": [
+            {"title": "Intro", "start_time": 0.0, "end_time": 60.0},
+            {"title": "Main part", "start_time": 60.0, "end_time": 540.0},
+            {"title": "Outro", "start_time": 540.0, "end_time": 600.0},
+        ],
+    }
+
+
+def is_playlist(url):
+    return "list=" in url or "/@" in url or "/channel/" in url
+
+
+def make_entries(url):
+    # Newest first: raising QT_STUB_ENTRIES "publishes" new entries at the top
+    count = env_int("QT_STUB_ENTRIES", 20)
+    return [
+        {
+            "_type": "url",
+            "id": f"entry{count - 1 - n:06d}",
+            "url": f"https://www.youtube.com/watch?v=entry{count - 1 - n:06d}",
+            "title": f"Stub entry {count - 1 - n}",
+            "playlist_title": "Stub playlist",
+            "playlist_index": n + 1,
+        }
+        for n in range(count)
+    ]
+
+
+def render_template(template, values):
+    def repl(match):
+        value = values.get(match.group(1), "NA")
+        if match.group(2) and isinstance(value, (int, float)):
+            return time.strftime(match.group(2), time.gmtime(value))
+        if match.group(4) == "d" and isinstance(value, int):
+            return f"{value:{match.group(3)}d}"
+        return str(value)
+    return re.sub(r"%\((\w+)(?:>([^)]+))?\)(\d*)([sd])", repl, template)
+
+
+def print_template(template, info):
+    """Support the subset of yt-dlp's --print templates QuickTube uses."""
+    def repl(match):
+        field, keys, conv = match.group(1), match.group(2), match.group(3)
+        value = next((info[f] for f in field.split(",") if info.get(f) is not None), None) if field else info
+        if value is None:
+            return "NA"
+        if keys is not None:
+            wanted = keys.split(",")
+            pick = lambda item: {k: item[k] for k in wanted if item.get(k) is not None}
+            value = pick(value) if isinstance(value, dict) else [pick(item) for item in value]
+        return json.dumps(value) if conv == "j" else str(value)
+    return re.sub(r"%\(([\w,]*)(?:\.:?\.?\{([\w,]+)\})?\)([sdj])", repl, template)
+
+
+def write_file(path, fraction=1.0):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    remaining = int(env_int("QT_STUB_SIZE", 1024 * 1024) * fraction)
+    chunk = b"\0" * 65536
+    with open(path, "wb") as f:
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+    return path
+
+
+def option(args, *names, default=None):
+    for i, arg in enumerate(args):
+        if arg in names and i + 1 < len(args):
+            return args[i + 1]
+    return default
+
+
+def ytdlp(args):
+    if "--version" in args:
+        print("2099.01.01")
+        return 0
+    cookie_file = option(args, "--cookies")
+    if cookie_file and option(args, "--cookies-from-browser"):
+        with open(cookie_file, "w", encoding="utf-8") as f:
+            f.write("# Netscape HTTP Cookie File\n")
+            f.write(".youtube.com\tTRUE\t/\tTRUE\t2000000000\tSID\tstub\n")
+    url = args[-1] if args and not args[-1].startswith("-") and args[-1] != cookie_file else ""
+    if not url:
+        print("ERROR: You must provide at least one URL.", file=sys.stderr)
+        return 2
+    if should_fail(url):
+        print(f"ERROR: [stub] {url}: simulated failure", file=sys.stderr)
+        return 1
+
+    templates = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg in ("--print", "-O")]
+    after_move = [t.split(":", 1)[1] for t in templates if t.startswith("after_move:")]
+    templates = [t for t in templates if not t.startswith("after_move:")]
+    to_stdout = option(args, "-o", "--output") == "-"
+    if templates or after_move:
+        if is_playlist(url) and "--flat-playlist" in args:
+            infos = make_entries(url)
+        else:
+            infos = [make_info(url)]
+        for info in infos:
+            for template in templates:
+                template = template.split(":", 1)[1] if template.startswith("before_dl:") else template
+                if to_stdout:
+                    info = {**info, "ext": option(args, "--merge-output-format", default="mp4")}
+                # Like yt-dlp, -o - sends everything else to stderr
+                print(print_template(template, info), flush=True, file=sys.stderr if to_stdout else sys.stdout)
+        # Like yt-dlp, --print implies --simulate
+        if "--no-simulate" not in args:
+            return 0
+    elif "-J" in args or "--dump-single-json" in args:
+        print(json.dumps(make_info(url)))
+        return 0
+    elif "--dump-json" in args or "-j" in args:
+        if is_playlist(url) and "--flat-playlist" in args:
+            for entry in make_entries(url):
+                print(json.dumps(entry))
+        else:
+            print(json.dumps(make_info(url)))
+        return 0
+
+    if to_stdout:
+        remaining = env_int("QT_STUB_SIZE", 1024 * 1024)
+        chunk = b"\0" * 65536
+        while remaining > 0:
+            sys.stdout.buffer.write(chunk[:remaining])
+            remaining -= len(chunk)
+        sys.stdout.buffer.flush()
+        return 0
+
+    # Download
+    out_dir = option(args, "-P", "--paths", default=".")
+    template = option(args, "-o", "--output", default="%(title)s [%(id)s].%(ext)s")
+    ext = option(args, "--merge-output-format", default=None)
+    if "-x" in args:
+        ext = option(args, "--audio-format", default="opus")
+    vid = video_id(url)
+    values = {
+        "id": vid, "title": f"Stub video {vid}", "ext": ext or "mp4", "height": 1080,
+        "playlist": "Stub playlist", "playlist_index": 1, "series": "Stub series",
+        "season_number": 1, "episode_number": 1,
+    }
+    progress = option(args, "--progress-template")
+    if progress and progress.startswith("download:"):
+        total = env_int("QT_STUB_SIZE", 1024 * 1024)
+        for done in (total // 4, total // 2, total):
+            fields = {"status": "downloading" if done < total else "finished", "downloaded_bytes": done,
+                      "total_bytes": total, "total_bytes_estimate": "NA", "speed": 1048576.0, "eta": 1}
+            line = re.sub(r"%\(progress\.(\w+)\)s", lambda m: str(fields.get(m.group(1), "NA")), progress[9:])
+            print(line, file=sys.stderr, flush=True)
+    # --download-sections "*start-end": one file per section
+    sections = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == "--download-sections"]
+    parts = [None]
+    if sections:
+        parts = []
+        for spec in sections:
+            start, _, end = spec.lstrip("*").partition("-")
+            start = float(start or 0)
+            end = 600.0 if end in ("", "inf") else min(float(end), 600.0)
+            parts.append((start, end))
+    for part in parts:
+        section = {"section_start": part[0], "section_end": part[1]} if part else {}
+        fraction = (part[1] - part[0]) / 600 if part else 1.0
+        path = write_file(os.path.join(out_dir, render_template(template, {**values, **section})), fraction)
+        for after in after_move:
+            print(print_template(after, {**values, "filepath": os.path.abspath(path), "duration": 600}))
+    return 0
+
+
+def svtplay(args):
+    url = args[-1] if args else ""
+    if should_fail(url):
+        print(f"ERROR: [stub] {url}: simulated failure", file=sys.stderr)
+        return 1
+    name = url.rstrip("/").rsplit("/", 1)[-1] or "svt"
+    write_file(os.path.join(os.getcwd(), f"{name}.{'m4a' if '--only-audio' in args else 'mp4'}"))
+    return 0
+
+
+def mpv(args):
+    if "-" not in args:
+        return 0
+    limit = env_int("QT_STUB_MPV_QUIT_AFTER", -1)
+    read = 0
+    while limit < 0 or read < limit:
+        data = sys.stdin.buffer.read(65536)
+        if not data:
+            break
+        read += len(data)
+    return 0
+
+
+def ffmpeg(args):
+    if "-version" in args:
+        print("ffmpeg version 99.0-stub")
+    return 0
+
+
+def main():
+    name = os.path.basename(sys.argv[0]).lower()
+    if name.endswith(".exe"):
+        name = name[:-4]
+    args = sys.argv[1:]
+
+    latency = env_float("QT_STUB_LATENCY", 0)
+    if latency > 0:
+        time.sleep(latency)
+
+    if name == "yt-dlp":
+        return ytdlp(args)
+    if name == "svtplay-dl":
+        return svtplay(args)
+    if name == "ffmpeg":
+        return ffmpeg(args)
+    if name == "mpv":
+        return mpv(args)
+    # Clipboard tools: nothing to do
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+QuickTube end-to-end load harness.
+
+Runs the batch and playlist paths with the real yt-dlp against the synthetic
+media server in benchmarks/media_server.py, so no network access is needed.
+yt-dlp gets a private config (--proxy to the server, generic extractor, no
+fixups) and QuickTube a "loadtest" profile without post-processing, because
+the served media is filler. Usage (from the repository root):
+
+    python -m benchmarks.load --items 10 100 500 --jobs 16 --kind mixed
+    python -m benchmarks.load --scenarios playlist --items 50 --error-rate 0.05 --max-connections 32
+
+Reports throughput, latency percentiles and error rates per run as JSON.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.stubs import apply_env
+from benchmarks.run import fake_choose, quiet
+from benchmarks.media_server import KINDS, add_server_arguments, server_from_args, media_url, feed_url
+
+PROFILE = "loadtest"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[rank], 4)
+
+
+def latency_summary(values):
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def item_kind(kind, n):
+    return KINDS[n % len(KINDS)] if kind == "mixed" else kind
+
+
+def write_ytdlp_config(home, server, args):
+    """Point yt-dlp at the media server and skip work the filler media can't survive."""
+    path = os.path.join(home, ".config", "yt-dlp", "config")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = [
+        f"--proxy {server.proxy}",
+        "--force-generic-extractor",
+        "--fixup never",
+        "--no-mtime",
+    ]
+    if args.retries is not None:
+        lines += [f"--retries {args.retries}", f"--fragment-retries {args.retries}",
+                  f"--extractor-retries {args.retries}"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_quicktube_config(config_dir, args):
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "profiles.json"), "w", encoding="utf-8") as f:
+        json.dump({PROFILE: {"embed_thumbnail": False, "embed_metadata": False, "subtitles": [],
+                             "fragments": args.fragments}}, f, indent=2)
+    with open(os.path.join(config_dir, "settings.json"), "w", encoding="utf-8") as f:
+        json.dump({"profile": PROFILE}, f, indent=2)
+
+
+def run_batch_scenario(args, count, workdir):
+    """handle_batch_download on a links file, the way the menu and `quicktube FILE` run it."""
+    import src.batch as batch
+
+    links_file = os.path.join(workdir, f"links_{count}.txt")
+    with open(links_file, "w", encoding="utf-8") as f:
+        for n in range(count):
+            f.write(media_url(f"item{n:05d}", item_kind(args.kind, n)) + "\n")
+
+    results = []
+    original_run_batch = batch.run_batch
+
+    def run_batch(links, output_dir, mode="video", quality=None, jobs=1, **kwargs):
+        # Same call, with the harness's concurrency and the results kept
+        results.extend(original_run_batch(links, output_dir, mode, quality, jobs=args.jobs or len(links),
+                                          timeout=args.timeout, **kwargs))
+        return results
+
+    batch.run_batch = run_batch
+    batch.gum_choose = fake_choose(["Video (Best Quality)", PROFILE])
+    try:
+        with quiet():
+            batch.handle_batch_download(links_file)
+    finally:
+        batch.run_batch = original_run_batch
+
+    files = [mf for r in results for mf in r.files]
+    return {
+        "items": count,
+        "failed": sum(1 for r in results if not r.ok),
+        "files": len(files),
+        "bytes": sum(mf.size or 0 for mf in files),
+        "link_latency": latency_summary([r.elapsed for r in results if r.ok and r.elapsed is not None]),
+        "errors": sorted({r.error for r in results if r.error})[:10],
+    }
+
+
+def run_playlist_scenario(args, count, workdir):
+    """A playlist through handle_youtube's 'Download Full Playlist (Video)' path."""
+    import src.core as core
+
+    url = feed_url(f"list{count:05d}", count, args.kind if args.kind != "mixed" else "progressive")
+    downloads = []
+    original_download = core.api.download
+
+    async def download(*a, **kwargs):
+        result = await original_download(*a, timeout=args.timeout, **kwargs)
+        downloads.append(result)
+        return result
+
+    core.api.download = download
+    core.gum_choose = fake_choose(["Download Full Playlist (Video)"])
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with quiet():
+            core.handle_youtube(url)
+    finally:
+        core.api.download = original_download
+        os.chdir(cwd)
+
+    files = [mf for r in downloads for mf in r.files]
+    return {
+        "items": count,
+        "failed": max(count - len(files), 0),
+        "files": len(files),
+        "bytes": sum(mf.size or 0 for mf in files),
+        "errors": sorted({r.error for r in downloads if r.error})[:10],
+    }
+
+
+SCENARIOS = {
+    "batch": run_batch_scenario,
+    "playlist": run_playlist_scenario,
+}
+
+
+def run_one(name, count, args, env):
+    import src.config as config
+
+    workdir = tempfile.mkdtemp(prefix=f"{name}-{count}-", dir=args.workdir)
+    server = server_from_args(args).start()
+    try:
+        write_ytdlp_config(env["HOME"], server, args)
+        config.load_settings()
+
+        start = time.monotonic()
+        result = SCENARIOS[name](args, count, workdir)
+        wall = time.monotonic() - start
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    spans = server.stats.item_spans()
+    done = result["items"] - result["failed"]
+    result.update({
+        "scenario": name,
+        "jobs": args.jobs or count,
+        "wall": round(wall, 3),
+        "items_per_second": round(done / wall, 3) if wall else None,
+        "bytes_per_second": round(result["bytes"] / wall) if wall else None,
+        "error_rate": round(result["failed"] / result["items"], 4) if result["items"] else 0,
+        "item_latency": latency_summary(list(spans.values())),
+        "server": server.stats.snapshot(),
+    })
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="QuickTube end-to-end load harness")
+    parser.add_argument("--out", default="load_report.json", help="Where to write the JSON report")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--jobs", type=int, default=8, help="Parallel downloads in batch runs (0 = all at once)")
+    parser.add_argument("--kind", choices=[*KINDS, "mixed"], default="mixed")
+    parser.add_argument("--timeout", type=float, help="Per-download timeout in seconds")
+    parser.add_argument("--retries", type=int, help="yt-dlp --retries/--fragment-retries (default: yt-dlp's)")
+    parser.add_argument("--fragments", type=int, help="Concurrent fragments per HLS/DASH download")
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not shutil.which("yt-dlp"):
+        print("yt-dlp was not found on PATH; the load harness needs the real one.", file=sys.stderr)
+        sys.exit(1)
+
+    args.workdir = tempfile.mkdtemp(prefix="quicktube-load-")
+    original_env = dict(os.environ)
+    original_argv = list(sys.argv)
+
+    # Private home: yt-dlp config, QuickTube profile/settings and log.txt stay out of the real ones
+    env = dict(os.environ)
+    env["HOME"] = os.path.join(args.workdir, "home")
+    env["APPDATA"] = env["HOME"]
+    env.pop("XDG_CONFIG_HOME", None)
+    env.pop("QUICKTUBE_SCRATCH", None)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("out", "workdir")},
+        },
+        "results": {},
+    }
+
+    apply_env(env)
+    sys.argv = [os.path.join(args.workdir, "quicktube")]
+    try:
+        import src.config as config
+        write_quicktube_config(config.get_user_config_dir(), args)
+        for name in args.scenarios:
+            for count in args.items:
+                print(f"Running {name} with {count} items...", file=sys.stderr)
+                report["results"][f"{name}_{count}"] = run_one(name, count, args, env)
+    finally:
+        apply_env(original_env)
+        sys.argv = original_argv
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'run':<16} {'items/s':>8} {'MB/s':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'errors':>7} {'5xx/429':>8}")
+    for name, r in report["results"].items():
+        lat = r["item_latency"]
+        server_errors = sum(n for code, n in r["server"]["status"].items() if code == 429 or code >= 500)
+        print(f"{name:<16} {r['items_per_second'] or 0:>8.2f} {(r['bytes_per_second'] or 0) / 1e6:>8.2f} "
+              f"{lat['p50'] or 0:>7.2f} {lat['p90'] or 0:>7.2f} {lat['p99'] or 0:>7.2f} "
+              f"{r['error_rate']:>7.1%} {server_errors:>8}")
+    print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Synthetic media server for load tests.
+
+Serves fake progressive files, HLS and DASH streams and RSS "playlists" from
+a local HTTP server whose bandwidth, latency, error rate and connection limit
+are configurable. It also accepts proxy-style requests, so with yt-dlp's
+--proxy pointed at it, links that look like real sites (and therefore pass
+QuickTube's link check) are answered locally:
+
+    http://www.youtube.com/media/item0001.mp4      progressive
+    http://www.youtube.com/hls/item0001.m3u8       HLS (master + media playlist)
+    http://www.youtube.com/dash/item0001.mpd       DASH (SegmentTemplate)
+    http://www.youtube.com/feed/demo.rss?list=demo&items=50&kind=hls
+                                                   RSS feed, a playlist for
+                                                   yt-dlp's generic extractor
+                                                   (list= marks it as one for
+                                                   QuickTube's menus)
+
+The media bytes are filler, so downloads must not be post-processed (see
+benchmarks/load.py for the matching yt-dlp configuration). Standalone:
+
+    python -m benchmarks.media_server --port 8700 --bandwidth 2000000 --error-rate 0.05
+"""
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNK_SIZE = 16 * 1024
+KINDS = ("progressive", "hls", "dash")
+LINK_HOST = "http://www.youtube.com"
+# Feed entries use a host no site extractor claims, so yt-dlp re-extracts them generically
+ENTRY_HOST = "http://media.quicktube.test"
+
+
+class TokenBucket:
+    """Limit a byte stream to `rate` bytes per second (None = unlimited)."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class ServerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.status = {}
+        self.injected = 0
+        self.rejected = 0
+        self.aborted = 0
+        self.connections = 0
+        self.peak_connections = 0
+        self.items = {}  # media item -> [first request, last response] (monotonic)
+
+    def touch(self, item):
+        now = time.monotonic()
+        with self.lock:
+            self.items.setdefault(item, [now, now])[1] = now
+
+    def item_spans(self):
+        """Seconds from the first request for each item to its last byte."""
+        with self.lock:
+            return {item: last - first for item, (first, last) in self.items.items()}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "bytes": self.bytes,
+                "status": dict(sorted(self.status.items())),
+                "injected_errors": self.injected,
+                "rejected_connections": self.rejected,
+                "aborted_by_client": self.aborted,
+                "peak_connections": self.peak_connections,
+            }
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "QuickTubeMediaServer/1.0"
+
+    def log_message(self, format, *args):
+        pass # Thousands of requests per run, keep the console clean
+
+    def setup(self):
+        super().setup()
+        stats = self.server.stats
+        with stats.lock:
+            stats.connections += 1
+            stats.peak_connections = max(stats.peak_connections, stats.connections)
+            self.over_cap = bool(self.server.max_connections) and stats.connections > self.server.max_connections
+
+    def finish(self):
+        with self.server.stats.lock:
+            self.server.stats.connections -= 1
+        super().finish()
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    # --- routing ---------------------------------------------------------
+
+    def respond(self, head):
+        server = self.server
+        # Proxy requests carry the absolute URL, direct ones just the path
+        parts = urlsplit(self.path)
+        path, query = parts.path, parse_qs(parts.query)
+
+        with server.stats.lock:
+            server.stats.requests += 1
+
+        if self.over_cap:
+            with server.stats.lock:
+                server.stats.rejected += 1
+            return self.send_error_status(503, retry_after=1, close=True)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        code = server.pick_error()
+        if code:
+            with server.stats.lock:
+                server.stats.injected += 1
+            return self.send_error_status(code, retry_after=1 if code in (429, 503) else None)
+
+        routes = [
+            (r"/media/([\w-]+)\.mp4", self.progressive),
+            (r"/hls/([\w-]+)\.m3u8", self.hls_master),
+            (r"/hls/([\w-]+)/index\.m3u8", self.hls_media),
+            (r"/hls/([\w-]+)/(\d+)\.ts", self.segment),
+            (r"/dash/([\w-]+)\.mpd", self.dash_manifest),
+            (r"/dash/([\w-]+)/(init|\d+)\.m4s", self.segment),
+            (r"/feed/([\w-]+)\.rss", self.feed),
+        ]
+        for pattern, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if match:
+                if handler == self.feed:
+                    return handler(head, query, *match.groups())
+                self.server.stats.touch(match.group(1))
+                handler(head, query, *match.groups())
+                self.server.stats.touch(match.group(1))
+                return
+        self.send_error_status(404)
+
+    # --- responses -------------------------------------------------------
+
+    def send_error_status(self, code, retry_after=None, close=False):
+        body = f"{code}\n".encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after:
+            self.send_header("Retry-After", str(retry_after))
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if self.command != "HEAD":
+            self.write_body(body)
+        self.count(code)
+
+    def send_text(self, head, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.write_body(body)
+        self.count(200)
+
+    def send_bytes(self, head, size, content_type):
+        """Send `size` filler bytes, honouring a single Range request."""
+        start, end, code = 0, size - 1, 200
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and size:
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2) or 0), 0)
+            if start > end:
+                return self.send_error_status(416)
+            code = 206
+
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not head:
+            remaining = end - start + 1
+            chunk = self.server.filler
+            while remaining > 0:
+                piece = chunk[:min(remaining, len(chunk))]
+                self.write_body(piece)
+                remaining -= len(piece)
+        self.count(code)
+
+    def write_body(self, data):
+        self.server.bandwidth.consume(len(data))
+        self.connection_bucket.consume(len(data))
+        self.wfile.write(data)
+        with self.server.stats.lock:
+            self.server.stats.bytes += len(data)
+
+    def count(self, code):
+        with self.server.stats.lock:
+            self.server.stats.status[code] = self.server.stats.status.get(code, 0) + 1
+
+    @property
+    def connection_bucket(self):
+        if not hasattr(self, "_bucket"):
+            self._bucket = TokenBucket(self.server.connection_bandwidth)
+        return self._bucket
+
+    # --- media -----------------------------------------------------------
+
+    def progressive(self, head, query, item):
+        self.send_bytes(head, self.server.size, "video/mp4")
+
+    def hls_master(self, head, query, item):
+        self.send_text(head, (
+            "#EXTM3U\n"
+            "#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS=\"avc1.64001f,mp4a.40.2\"\n"
+            f"{item}/index.m3u8\n"
+        ), "application/vnd.apple.mpegurl")
+
+    def hls_media(self, head, query, item):
+        server = self.server
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:VOD",
+                 f"#EXT-X-TARGETDURATION:{server.segment_duration}", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for n in range(server.segments):
+            lines += [f"#EXTINF:{server.segment_duration}.0,", f"{n}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        self.send_text(head, "\n".join(lines) + "\n", "application/vnd.apple.mpegurl")
+
+    def dash_manifest(self, head, query, item):
+        server = self.server
+        duration = server.segments * server.segment_duration
+        self.send_text(head, f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S"
+     mediaPresentationDuration="PT{duration}S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <Period id="0" start="PT0S">
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="av" bandwidth="2000000" width="1280" height="720" codecs="avc1.64001f,mp4a.40.2">
+        <SegmentTemplate timescale="1" duration="{server.segment_duration}" startNumber="0"
+                         initialization="{item}/init.m4s" media="{item}/$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+""", "application/dash+xml")
+
+    def segment(self, head, query, item, number):
+        self.send_bytes(head, self.server.segment_size, "video/mp4" if number == "init" else "video/MP2T")
+
+    def feed(self, head, query, name):
+        count = int(query.get("items", ["10"])[0])
+        kind = query.get("kind", ["progressive"])[0]
+        items = "".join(
+            f"<item><title>{name}-{n:04d}</title><guid>{name}-{n:04d}</guid>"
+            f"<enclosure url=\"{media_url(f'{name}-{n:04d}', kind, ENTRY_HOST)}\" type=\"video/mp4\"/></item>"
+            for n in range(count)
+        )
+        self.send_text(head, (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            f"<rss version=\"2.0\"><channel><title>{name}</title>{items}</channel></rss>"
+        ), "application/rss+xml")
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=("127.0.0.1", 0), size=1024 * 1024, segments=10, segment_duration=4,
+                 bandwidth=None, connection_bandwidth=None, latency=0.0, error_rate=0.0,
+                 error_codes=(429, 500, 503), max_connections=None, seed="quicktube"):
+        super().__init__(address, MediaHandler)
+        self.size = size
+        self.segments = max(1, segments)
+        self.segment_duration = segment_duration
+        self.segment_size = max(1, size // self.segments)
+        self.bandwidth = TokenBucket(bandwidth)
+        self.connection_bandwidth = connection_bandwidth
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.max_connections = max_connections
+        self.stats = ServerStats()
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.filler = bytes(range(256)) * (CHUNK_SIZE // 256)
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-body all the time (yt-dlp sniffs media URLs,
+        # timeouts kill downloads); count it instead of printing a traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            with self.stats.lock:
+                self.stats.aborted += 1
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def proxy(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def pick_error(self):
+        if not self.error_rate:
+            return None
+        with self.random_lock:
+            if self.random.random() < self.error_rate:
+                return self.random.choice(self.error_codes)
+        return None
+
+    def start(self):
+        """Serve from a background thread; returns self."""
+        thread = threading.Thread(target=self.serve_forever, name="media-server", daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def media_url(item, kind="progressive", host=LINK_HOST):
+    if kind == "hls":
+        return f"{host}/hls/{item}.m3u8"
+    if kind == "dash":
+        return f"{host}/dash/{item}.mpd"
+    return f"{host}/media/{item}.mp4"
+
+
+def feed_url(name, items, kind="progressive", host=LINK_HOST):
+    return f"{host}/feed/{name}.rss?list={name}&items={items}&kind={kind}"
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="Bytes per media item")
+    parser.add_argument("--segments", type=int, default=10, help="Segments per HLS/DASH item")
+    parser.add_argument("--bandwidth", type=int, help="Total server bandwidth in bytes/s")
+    parser.add_argument("--connection-bandwidth", type=int, help="Bandwidth per connection in bytes/s")
+    parser.add_argument("--server-latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-codes", type=int, nargs="+", default=[429, 500, 503])
+    parser.add_argument("--max-connections", type=int, help="Answer 503 above this many open connections")
+    parser.add_argument("--seed", default="quicktube")
+
+
+def server_from_args(args, port=0):
+    return MediaServer(
+        ("127.0.0.1", port), size=args.size, segments=args.segments, bandwidth=args.bandwidth,
+        connection_bandwidth=args.connection_bandwidth, latency=args.server_latency,
+        error_rate=args.error_rate, error_codes=args.error_codes, max_connections=args.max_connections,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic media server for QuickTube load tests")
+    parser.add_argument("--port", type=int, default=8700)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = server_from_args(args, args.port)
+    print(f"Serving on {server.proxy} (use it as yt-dlp --proxy)", file=sys.stderr)
+    print(f"Example: {media_url('item0001', 'hls')}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.stats.snapshot(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+QuickTube benchmark suite.
+
+Runs against the fake tools in benchmarks/fake_tool.py, so no network access
+or real yt-dlp/svtplay-dl is needed. Usage (from the repository root):
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --out new.json --compare bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.stubs import install_stubs, stub_env, apply_env
+
+
+def summarize(samples, **params):
+    return {
+        "unit": "s",
+        "params": params,
+        "samples": [round(s, 6) for s in samples],
+        "min": round(min(samples), 6),
+        "median": round(statistics.median(samples), 6),
+        "mean": round(statistics.mean(samples), 6),
+        "max": round(max(samples), 6),
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow console output from gum_style/print while timing."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def fake_choose(picks):
+    """Return a gum_choose replacement that answers with the first matching pick."""
+    def choose(choices, header=None):
+        values = [getattr(c, "value", c) for c in choices]
+        for pick in picks:
+            if pick in values:
+                return pick
+        return values[0] if values else None
+    return choose
+
+
+def bench_startup(args, env):
+    main_py = os.path.join(ROOT_DIR, "main.py")
+    missing = os.path.join(args.workdir, "does-not-exist.txt")
+
+    def run():
+        subprocess.run([sys.executable, main_py, missing], env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return {"startup": summarize(timed(run, args.repeat))}
+
+
+def bench_batch(args, env):
+    import src.batch as batch
+
+    results = {}
+    batch.gum_choose = fake_choose(["Video (Best Quality)"])
+    for count in args.links:
+        links_file = os.path.join(args.workdir, f"links_{count}.txt")
+        with open(links_file, "w", encoding="utf-8") as f:
+            for n in range(count):
+                if n % 4 == 3:
+                    f.write(f"https://www.svtplay.se/video/{n:08d}/stub-episode\n")
+                else:
+                    f.write(f"https://www.youtube.com/watch?v=bench{n:06d}\n")
+        out_dir = os.path.join(args.workdir, f"links_{count}")
+
+        def run():
+            shutil.rmtree(out_dir, ignore_errors=True)
+            sys.argv = [sys.argv[0], links_file]
+            with quiet():
+                batch.handle_batch_download(links_file)
+
+        samples = timed(run, args.repeat)
+        entry = summarize(samples, links=count, latency=args.latency)
+        entry["links_per_second"] = round(count / statistics.median(samples), 3)
+        results[f"batch_{count}"] = entry
+    return results
+
+
+def bench_format_table(args, env):
+    import src.core as core
+
+    results = {}
+    core.gum_choose = fake_choose(["Download video"])
+    url = "https://www.youtube.com/watch?v=benchformat"
+    cwd = os.getcwd()
+    os.chdir(args.workdir)
+    try:
+        for count in args.formats:
+            os.environ["QT_STUB_FORMATS"] = str(count)
+
+            def run():
+                with quiet():
+                    core.handle_youtube(url)
+
+            results[f"format_table_{count}"] = summarize(timed(run, args.repeat), formats=count)
+    finally:
+        os.environ["QT_STUB_FORMATS"] = env["QT_STUB_FORMATS"]
+        os.chdir(cwd)
+    return results
+
+
+def bench_history(args, env):
+    import src.history as history
+
+    def write():
+        for n in range(args.history_ops):
+            history.add_to_history(f"Title {n}", f"https://www.youtube.com/watch?v=hist{n:07d}")
+
+    def read():
+        for _ in range(args.history_ops):
+            history.load_history()
+
+    return {
+        "history_write": summarize(timed(write, args.repeat), ops=args.history_ops),
+        "history_read": summarize(timed(read, args.repeat), ops=args.history_ops),
+    }
+
+
+def router_links(count):
+    """Link variants as they show up in real link files: tracking params, short links, duplicates."""
+    variants = [
+        "https://www.youtube.com/watch?v={id}",
+        "https://youtu.be/{id}?si=AbCdEfGhIjKlMnOp",
+        "https://www.youtube.com/watch?v={id}&t=30s&feature=share",
+        "https://music.youtube.com/watch?v={id}&si=x",
+        "https://m.youtube.com/shorts/{id}",
+        "https://www.youtube.com/playlist?list=PL{id}&utm_source=newsletter",
+        "https://www.svtplay.se/video/{id}/some-show/episode-1?utm_source=x",
+        "https://www.svtplay.se/some-show?id={id}",
+        "https://example.com/not-a-video/{id}",
+    ]
+    # Roughly one link in six repeats an earlier video in another form
+    return [
+        variants[n % len(variants)].format(id=f"r{(n if n % 3 else n // 2):010d}")
+        for n in range(count)
+    ]
+
+
+def bench_router(args, env):
+    import src.router as router
+    from src.api import is_valid_url, site_for
+    from src.batch import read_links
+
+    results = {}
+    for count in args.router_links:
+        links_file = os.path.join(args.workdir, f"router_{count}.txt")
+        with open(links_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(router_links(count)) + "\n")
+
+        def classify():
+            router.route.cache_clear()
+            for url in read_links(links_file):
+                if is_valid_url(url):
+                    site_for(url)
+
+        def dedupe():
+            router.route.cache_clear()
+            router.dedupe(read_links(links_file))
+
+        unique, duplicates = router.dedupe(read_links(links_file))
+        classify_samples = timed(classify, args.repeat)
+        entry = summarize(classify_samples, links=count)
+        entry["links_per_second"] = round(count / statistics.median(classify_samples))
+        results[f"router_classify_{count}"] = entry
+
+        entry = summarize(timed(dedupe, args.repeat), links=count, unique=len(unique), duplicates=len(duplicates))
+        results[f"router_dedupe_{count}"] = entry
+    return results
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "batch": bench_batch,
+    "format_table": bench_format_table,
+    "history": bench_history,
+    "router": bench_router,
+}
+
+
+def compare(report, baseline_path):
+    try:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read baseline {baseline_path}: {e}")
+        return
+
+    print(f"\n{'benchmark':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = (result["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0
+        print(f"{name:<24} {old['median']:>10.4f} {result['median']:>10.4f} {change:>+7.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="QuickTube benchmark suite")
+    parser.add_argument("--out", default="bench_report.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Earlier report to compare medians against")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--links", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--formats", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--history-ops", type=int, default=200)
+    parser.add_argument("--router-links", type=int, nargs="+", default=[10000, 100000],
+                        help="Link file sizes for the URL router benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake tool latency in seconds")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Bytes per fake download")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--entries", type=int, default=20, help="Entries per fake playlist")
+    parser.add_argument("--caption-langs", type=int, default=100)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.workdir = tempfile.mkdtemp(prefix="quicktube-bench-")
+    original_env = dict(os.environ)
+    original_argv = list(sys.argv)
+
+    bin_dir = install_stubs(os.path.join(args.workdir, "bin"))
+    env = stub_env(bin_dir, latency=args.latency, size=args.size, fail_rate=args.fail_rate,
+                   entries=args.entries, caption_langs=args.caption_langs)
+    # Keep config, history and log.txt out of the real home and the repo
+    env["HOME"] = os.path.join(args.workdir, "home")
+    env["APPDATA"] = env["HOME"]
+    os.makedirs(env["HOME"], exist_ok=True)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "workdir")},
+        },
+        "results": {},
+    }
+
+    apply_env(env)
+    sys.argv = [os.path.join(args.workdir, "quicktube")]
+    try:
+        for name, bench in BENCHMARKS.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"Running {name}...", file=sys.stderr)
+            report["results"].update(bench(args, env))
+    finally:
+        apply_env(original_env)
+        sys.argv = original_argv
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report["results"].items():
+        print(f"{name:<24} median {result['median']:.4f}s  (min {result['min']:.4f}s, max {result['max']:.4f}s)")
+    print(f"Report written to {args.out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import stat
+import tempfile
+
+TOOLS = ["yt-dlp", "svtplay-dl", "mpv", "ffmpeg", "xclip", "wl-paste"]
+FAKE_TOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_tool.py")
+
+
+def install_stubs(bin_dir=None):
+    """Write fake tool executables into bin_dir (a new temp dir if None) and return it."""
+    if bin_dir is None:
+        bin_dir = tempfile.mkdtemp(prefix="quicktube-stubs-")
+    os.makedirs(bin_dir, exist_ok=True)
+
+    with open(FAKE_TOOL, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"#!{sys.executable}\n")
+            f.write(source)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def stub_env(bin_dir, latency=0.0, size=1024 * 1024, fail_rate=0.0, formats=30, entries=20,
+             caption_langs=100, seed="quicktube", base=None):
+    """Return an environment with the stubs first on PATH and their knobs set."""
+    env = dict(os.environ if base is None else base)
+    env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+    env.update({
+        "QT_STUB_LATENCY": str(latency),
+        "QT_STUB_SIZE": str(size),
+        "QT_STUB_FAIL_RATE": str(fail_rate),
+        "QT_STUB_FORMATS": str(formats),
+        "QT_STUB_ENTRIES": str(entries),
+        "QT_STUB_CAPTION_LANGS": str(caption_langs),
+        "QT_STUB_SEED": str(seed),
+    })
+    return env
+
+
+def apply_env(env):
+    """Replace os.environ in-place so in-process code and its children see env."""
+    os.environ.clear()
+    os.environ.update(env)
@@ -20,21 +20,33 @@ if current_dir not in sys.path:
 from InquirerPy.base.control import Choice
 from InquirerPy.separator import Separator
 
-from src.config import setup_resources, check_dependencies
+from src.config import setup_resources, check_dependencies, load_settings
 from src.utils import write_log
 from src.clipboard import get_clipboard
 from src.ui import gum_input, gum_choose
-from src.core import handle_svtplay, handle_youtube, select_cookie_browser, update_tools, is_valid_url
+from src.core import (
+    handle_svtplay, handle_youtube, select_cookie_browser, select_profile, update_tools, is_valid_url,
+    sync_subscriptions, site_for
+)
 from src.history import load_history
 from src.batch import handle_batch_download
 from src.guide import show_guide
+from src.cli import run_cli, COMMANDS
 
 def main():
     # Setup PATH to include bundled or local tools
     setup_resources()
+
+    # Headless commands: quicktube get/info ... (JSON on stdout, no prompts)
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        load_settings()
+        sys.exit(run_cli(sys.argv[1:]))
     
     # Ensure dependencies exist
     check_dependencies()
+
+    # Restore saved settings (cookie browser)
+    load_settings()
     
     # CLI Support: quicktube <filename>
     if len(sys.argv) > 1:
@@ -75,8 +87,10 @@ def main():
             menu_choices = [
                 Choice(value="Paste link", name="Paste link"),
                 Choice(value="Batch", name="Batch Download from file"),
+                Choice(value="Sync", name="Sync subscriptions"),
                 Choice(value="Update tools", name="Update tools"),
-                Choice(value="Select cookie browser", name="Select cookie browser")
+                Choice(value="Select cookie browser", name="Select cookie browser"),
+                Choice(value="Select download profile", name="Select download profile")
             ]
             
             if history:
@@ -102,6 +116,12 @@ def main():
             elif choice == "Select cookie browser":
                 select_cookie_browser()
                 continue
+            elif choice == "Select download profile":
+                select_profile()
+                continue
+            elif choice == "Sync":
+                sync_subscriptions()
+                continue
             elif choice == "Batch":
                 handle_batch_download()
                 continue
@@ -116,9 +136,7 @@ def main():
                 # If it's none of the above, it must be a URL from history
                 url = choice
 
-        is_svt = "svtplay.se" in url
-        
-        if is_svt:
+        if site_for(url) == "svtplay":
             last_action = handle_svtplay(url)
         else:
             last_action = handle_youtube(url)
@@ -152,4 +170,6 @@ if __name__ == "__main__":
         sys.exit(0)
     except Exception as e:
         write_log(f"CRITICAL ERROR: {e}")
-        input("Press Enter to exit...")
+        if sys.stdin.isatty():
+            input("Press Enter to exit...")
+        sys.exit(1)
@@ -0,0 +1,958 @@
+"""
+UI-free asyncio API for QuickTube.
+
+Everything here runs the tools with asyncio.create_subprocess_exec, never
+prompts or prints, and returns dataclasses. The interactive menu, batch mode
+and the headless CLI are all clients of this module, and it can be embedded
+in other asyncio programs:
+
+    result = await api.download(url, "out", mode="audio", progress=callback, timeout=600)
+
+Cancelling the awaiting task (or hitting a timeout) kills the child process.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import functools
+import contextlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src.utils import write_log
+from src.cookies import checkout_cookies, release_cookies, invalidate_cookies, is_auth_error
+from src.formats import FORMATS_TEMPLATE, parse_formats
+from src import clips
+from src import metrics
+from src import priority
+from src import profiles
+from src import router
+from src.storage import finalize, atomic_move, free_space, SpaceBudget, SPACE_MARGIN, SCRATCH_FACTOR
+import src.config as config
+
+# Printed by yt-dlp after each finished file so we know what was saved
+RESULT_TEMPLATE = "after_move:%(.{id,title,filepath,duration,filesize,filesize_approx})j"
+
+PROGRESS_PREFIX = "QTPROGRESS"
+PROGRESS_TEMPLATE = (
+    "download:" + PROGRESS_PREFIX +
+    " %(progress.status)s %(progress.downloaded_bytes)s %(progress.total_bytes)s"
+    " %(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s"
+)
+SVT_PROGRESS = re.compile(r"\[(\d+)/(\d+)\]")
+
+# Assumed size when metadata has no file size
+DEFAULT_ESTIMATE = {"video": 1024 * 1024 * 1024, "audio": 100 * 1024 * 1024}
+
+# How long a killed tool gets to clean up before SIGKILL
+KILL_GRACE = 5
+
+# Returned by an on_line callback to end the tool early (see run_tool)
+STOP = "stop"
+
+# Enumerating a playlist prints one of these per entry
+ENTRY_TEMPLATE = "%(.{id,url,title,playlist_title})j"
+
+# What the single-video menu needs besides the formats (see probe_video)
+VIDEO_TEMPLATE = "%(.{id,title,duration,chapters})j"
+
+# Watch and keep: printed (to stderr, stdout carries the media) before the download
+KEEP_PREFIX = "QTKEEP "
+KEEP_TEMPLATE = "before_dl:" + KEEP_PREFIX + "%(.{id,title,ext})j"
+
+# Bytes downloaded before mpv is started, enough for it to probe the container
+PLAYER_PREBUFFER = 512 * 1024
+
+
+@dataclass
+class Progress:
+    url: str
+    status: str
+    downloaded_bytes: int = 0
+    total_bytes: int = 0
+    speed: float = 0
+    eta: int = 0
+
+    @property
+    def percent(self):
+        if not self.total_bytes:
+            return None
+        return min(100.0, self.downloaded_bytes * 100 / self.total_bytes)
+
+
+@dataclass
+class ToolResult:
+    cmd: list
+    returncode: int = None
+    stdout: list = field(default_factory=list)
+    stderr: list = field(default_factory=list)
+    elapsed: float = 0.0
+    timed_out: bool = False
+    stopped: bool = False
+
+
+@dataclass
+class MediaFile:
+    path: str
+    size: int = None
+    title: str = None
+    id: str = None
+    duration: float = None
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    site: str
+    ok: bool = False
+    returncode: int = None
+    files: list = field(default_factory=list)
+    elapsed: float = 0.0
+    error: str = None
+    timed_out: bool = False
+
+
+@dataclass
+class ProbeResult:
+    url: str
+    site: str
+    ok: bool = False
+    title: str = None
+    id: str = None
+    duration: float = None
+    is_playlist: bool = False
+    entries: list = field(default_factory=list)
+    formats: list = field(default_factory=list)
+    chapters: list = field(default_factory=list)  # {"title", "start_time", "end_time"}
+    error: str = None
+
+
+def is_valid_url(text):
+    """Check if the text is a link to a supported site."""
+    return router.route(text) is not None
+
+def site_for(url):
+    """Site of a link ("youtube", "svtplay"), None for links no site handler claims."""
+    return router.site_for(url)
+
+def video_format(quality=None, codec=None):
+    """
+    Format selector for best mp4 video, optionally capped at a max height.
+    With a preferred codec any container is allowed and the codec is chosen
+    by sorting (-S vcodec:...) instead.
+    """
+    cap = f"[height<={quality}]" if quality else ""
+    if codec:
+        return f"bestvideo{cap}+bestaudio/best{cap}/best"
+    if not quality:
+        return "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
+    return f"bestvideo{cap}[ext=mp4]+bestaudio[ext=m4a]/best{cap}[ext=mp4]/best{cap}/best"
+
+def ytdlp_base_cmd(cookie_args=()):
+    """Return base command for yt-dlp with the cookie arguments (see run_with_cookies)."""
+    return ["yt-dlp", "--no-warnings", *cookie_args]
+
+def last_error(lines):
+    """Pick the most useful line from a tool's error output."""
+    lines = [l.strip() for l in lines if l.strip()]
+    errors = [l for l in lines if "ERROR" in l.upper()]
+    if errors:
+        return errors[-1]
+    return lines[-1] if lines else None
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code (the menu, batch threads)."""
+    return asyncio.run(coro)
+
+
+async def _kill(proc):
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), KILL_GRACE)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+async def run_tool(cmd, cwd=None, timeout=None, on_line=None, capture=True, on_data=None, background=None):
+    """
+    Run a tool and collect its output.
+    on_line(line, stream) is called for every stdout/stderr line ("\\r" also
+    ends a line, so progress bars come through). Lines for which on_line
+    returns True are not kept in the result; returning STOP keeps the line
+    and terminates the tool (result.stopped is set).
+    With on_data (a coroutine function) stdout is passed to it as raw byte
+    chunks instead, for tools that write media to stdout.
+    background (a priority.Policy) lowers the tool's CPU and I/O priority;
+    the processes it starts (ffmpeg) inherit it.
+    Returns a ToolResult, or None if the tool isn't installed.
+    """
+    write_log(f"RUNNING COMMAND: {' '.join(cmd)}", console=False)
+    start = time.monotonic()
+    result = ToolResult(cmd=list(cmd))
+
+    pipe = asyncio.subprocess.PIPE if capture else None
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, stdout=pipe, stderr=pipe,
+                                                    **(background.spawn_kwargs() if background else {}))
+    except FileNotFoundError:
+        write_log(f"Command not found: {cmd[0]}", console=False)
+        return None
+    if background:
+        await background.apply(proc.pid)
+
+    def handle(line, sink, name):
+        verdict = on_line(line, name) if on_line else None
+        if verdict is not True:
+            sink.append(line)
+        if verdict == STOP:
+            result.stopped = True
+            return True
+        return False
+
+    async def pump(stream, sink, name):
+        buffer = ""
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            buffer += chunk.decode("utf-8", errors="replace")
+            *lines, buffer = re.split(r"\r\n|\r|\n", buffer)
+            for line in lines:
+                if handle(line, sink, name):
+                    await _kill(proc)
+                    return
+        if buffer:
+            handle(buffer, sink, name)
+
+    async def pump_data(stream):
+        while True:
+            chunk = await stream.read(1024 * 1024)
+            if not chunk:
+                break
+            await on_data(chunk)
+
+    waiters = [proc.wait()]
+    if capture:
+        stdout = pump_data(proc.stdout) if on_data else pump(proc.stdout, result.stdout, "stdout")
+        waiters += [stdout, pump(proc.stderr, result.stderr, "stderr")]
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        write_log(f"Timed out after {timeout}s: {' '.join(cmd)}", console=False)
+        await _kill(proc)
+    except asyncio.CancelledError:
+        await _kill(proc)
+        raise
+
+    result.returncode = proc.returncode
+    result.elapsed = round(time.monotonic() - start, 3)
+    return result
+
+
+async def run_extraction(url, cmd, **kwargs):
+    """run_tool for a metadata lookup, timed in the extraction histogram."""
+    with metrics.timed(metrics.EXTRACTION_SECONDS, site=metrics.site_label(site_for(url))):
+        return await run_tool(cmd, **kwargs)
+
+async def run_with_cookies(run):
+    """
+    Call run(cookie_args), a coroutine function returning a ToolResult, with
+    a private copy of the exported cookies. If yt-dlp rejects them they may
+    be stale: they are extracted from the browser again and run is retried
+    once.
+    """
+    for attempt in range(2):
+        cookie_args, exported = await asyncio.to_thread(checkout_cookies)
+        try:
+            res = await run(cookie_args)
+        finally:
+            await asyncio.to_thread(release_cookies, cookie_args)
+        if (attempt or not config.COOKIE_BROWSER or not res or res.returncode == 0 or res.stopped
+                or not is_auth_error("\n".join(res.stderr))):
+            return res
+        write_log("Auth error with exported cookies, refreshing...", console=False)
+        await asyncio.to_thread(invalidate_cookies, exported)
+
+async def fetch_info(url, timeout=None):
+    """
+    Run yt-dlp --flat-playlist --dump-json for a URL.
+    Returns (entries, result): one dict per printed JSON line (a single video
+    gives one entry, a playlist one per item) and the ToolResult.
+    entries is None if yt-dlp failed or printed something unparseable.
+    """
+    async def run(cookie_args):
+        cmd = ["yt-dlp", "--flat-playlist", "--dump-json", "--no-warnings", *cookie_args, url]
+        return await run_extraction(url, cmd, timeout=timeout)
+
+    res = await run_with_cookies(run)
+    if not res or res.returncode != 0:
+        return None, res
+
+    try:
+        entries = [json.loads(line) for line in res.stdout if line.strip()]
+    except json.JSONDecodeError:
+        return None, res
+    return entries, res
+
+async def probe_formats(url, timeout=None):
+    """
+    Fetch the format list for a single video.
+    Returns a list of FormatInfo, or None if yt-dlp failed.
+    """
+    async def run(cookie_args):
+        cmd = ["yt-dlp", "--no-warnings", "--skip-download", "--print", FORMATS_TEMPLATE, *cookie_args, url]
+        return await run_extraction(url, cmd, timeout=timeout)
+
+    async def run_full(cookie_args):
+        return await run_extraction(url, ["yt-dlp", "-J", *cookie_args, url], timeout=timeout)
+
+    res = await run_with_cookies(run)
+    if res and res.returncode == 0:
+        try:
+            return parse_formats(json.loads(res.stdout[0]))
+        except (json.JSONDecodeError, IndexError):
+            # Older yt-dlp versions don't understand the field selection
+            write_log("Compact format probe failed to parse, falling back to -J", console=False)
+
+    res = await run_with_cookies(run_full)
+    if not res or res.returncode != 0:
+        return None
+    try:
+        return parse_formats(json.loads("\n".join(res.stdout)).get("formats", []))
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+async def probe_video(url, timeout=None):
+    """
+    Title, id, duration and chapters of a single video plus its compact
+    format list, from one yt-dlp run that prints only those fields.
+    Returns (info, formats, result): info is None if yt-dlp failed; formats
+    is None if the format list couldn't be parsed (older yt-dlp, use
+    probe_formats then).
+    """
+    async def run(cookie_args):
+        cmd = ["yt-dlp", "--no-warnings", "--skip-download", "--no-playlist",
+               "--print", VIDEO_TEMPLATE, "--print", FORMATS_TEMPLATE, *cookie_args, url]
+        return await run_extraction(url, cmd, timeout=timeout)
+
+    res = await run_with_cookies(run)
+    if not res or res.returncode != 0:
+        return None, None, res
+    try:
+        info = json.loads(res.stdout[0])
+    except (json.JSONDecodeError, IndexError):
+        return None, None, res
+    try:
+        formats = parse_formats(json.loads(res.stdout[1]))
+    except (json.JSONDecodeError, IndexError):
+        write_log("Compact format probe failed to parse, probing formats separately", console=False)
+        formats = None
+    return info, formats, res
+
+async def probe(url, formats=True, timeout=None):
+    """Look up title, playlist entries and (for single videos) formats."""
+    result = ProbeResult(url=url, site=site_for(url))
+
+    entries, res = await fetch_info(url, timeout=timeout)
+    if not entries:
+        result.error = (last_error(res.stderr) if res else None) or "Could not retrieve information for the URL."
+        return result
+
+    info = entries[0]
+    result.ok = True
+    result.is_playlist = info.get("_type") == "playlist" or "list=" in url
+    if result.is_playlist:
+        result.title = info.get("playlist_title") or info.get("playlist") or info.get("title")
+        result.entries = entries
+    else:
+        result.title = info.get("title")
+        result.id = info.get("id")
+        result.duration = info.get("duration")
+        result.chapters = info.get("chapters") or []
+        if formats:
+            result.formats = await probe_formats(url, timeout=timeout) or []
+    return result
+
+
+async def list_entries(url, stop=None, timeout=None):
+    """
+    Enumerate the entries (id, url, title, playlist_title) of a playlist,
+    channel or series in the site's order, paging lazily. stop(entry) is
+    called for each entry; returning True ends the listing there, so a
+    newest-first list can be cut off at the first known items instead of
+    being paged through completely.
+    Returns (entries, result); entries is None if the listing failed.
+    """
+    entries = []
+
+    def on_line(line, stream):
+        if stream != "stdout" or not line.startswith("{"):
+            return False
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            return False
+        entries.append(entry)
+        if stop and stop(entry):
+            return STOP
+        return True
+
+    async def run(cookie_args):
+        entries.clear()
+        cmd = ["yt-dlp", "--flat-playlist", "--lazy-playlist", "--no-warnings",
+               "--print", ENTRY_TEMPLATE, *cookie_args, url]
+        return await run_extraction(url, cmd, timeout=timeout, on_line=on_line)
+
+    res = await run_with_cookies(run)
+    if not res or (res.returncode != 0 and not res.stopped):
+        return None, res
+    return entries, res
+
+def _num(value, cast):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def parse_progress(url, line):
+    """Parse one of our progress-template lines into a Progress, or None."""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    parts = line.split()
+    if len(parts) < 7:
+        return None
+    _, status, downloaded, total, estimate, speed, eta = parts[:7]
+    return Progress(
+        url=url,
+        status=status,
+        downloaded_bytes=_num(downloaded, int),
+        total_bytes=_num(total, int) or _num(estimate, int),
+        speed=_num(speed, float),
+        eta=_num(eta, int),
+    )
+
+def parse_results(lines):
+    """Parse the RESULT_TEMPLATE JSON lines into MediaFile records."""
+    files = []
+    for line in lines:
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(item, dict) or not item.get("filepath"):
+            continue
+        try:
+            size = os.path.getsize(item["filepath"])
+        except OSError:
+            size = item.get("filesize") or item.get("filesize_approx")
+        files.append(MediaFile(
+            path=item["filepath"], size=size, title=item.get("title"),
+            id=item.get("id"), duration=item.get("duration"),
+        ))
+    return files
+
+def build_ytdlp_download_cmd(url, output_dir, mode="video", quality=None, format_id=None,
+                             output_template="%(title)s.%(ext)s", extra_args=None, settings=None, cookie_args=()):
+    """
+    Build the yt-dlp command for a download (without progress/result printing).
+    mode is "video", "audio" or None to leave the format choice to yt-dlp.
+    settings is a resolved profiles.Profile (default: the configured profile).
+    """
+    settings = settings or profiles.resolve(site=site_for(url), mode=mode)
+    cmd = ytdlp_base_cmd(cookie_args)
+    cmd.extend(settings.ytdlp_args(mode))
+    # Use -P for path to ensure it goes into the right folder
+    cmd.extend(["-P", str(output_dir)])
+
+    if mode == "audio":
+        cmd.extend(["-f", "bestaudio/best", "-x", "--audio-format", "opus"])
+    elif mode == "video":
+        selector = format_id or video_format(quality or settings.max_height, settings.codec)
+        cmd.extend(["-f", selector, "--merge-output-format", "mp4"])
+
+    cmd.extend(["-o", output_template])
+    cmd.extend(extra_args or [])
+    cmd.append(url)
+    return cmd
+
+async def resolve_sections(url, spec, timeout=None):
+    """
+    Sections (clips.Section) of a link for a section spec like
+    "10:00-12:30, Intro". Chapter names are looked up in the video's
+    metadata, which is only fetched when the spec names chapters.
+    Returns (sections, duration, error).
+    """
+    try:
+        parsed = clips.parse_spec(spec)
+    except ValueError as e:
+        return None, None, str(e)
+
+    chapters, duration = None, None
+    if clips.needs_chapters(parsed):
+        entries, res = await fetch_info(url, timeout=timeout)
+        if not entries:
+            return None, None, (last_error(res.stderr) if res else None) or "Could not retrieve the chapter list."
+        chapters, duration = entries[0].get("chapters"), entries[0].get("duration")
+    try:
+        return clips.resolve(parsed, chapters, duration), duration, None
+    except ValueError as e:
+        return None, duration, str(e)
+
+async def estimate_size(url, mode="video", quality=None, timeout=None, profile=None, sections=None):
+    """
+    Estimated download size in bytes from metadata (summed over playlist
+    entries), or None if yt-dlp doesn't know. With sections only their
+    share of each video's duration is counted.
+    """
+    settings = await asyncio.to_thread(profiles.resolve, profile, site_for(url), mode)
+    parts = None
+    if sections:
+        parts, _, error = await resolve_sections(url, sections, timeout=timeout)
+        if error:
+            return None
+    if mode == "audio":
+        selector, sort = "bestaudio/best", []
+    else:
+        selector = video_format(quality or settings.max_height, settings.codec)
+        sort = ["-S", f"vcodec:{settings.codec}"] if settings.codec else []
+    async def run(cookie_args):
+        cmd = ["yt-dlp", "--no-warnings", "--skip-download", "-f", selector, *sort,
+               "--print", "%(filesize,filesize_approx)s %(duration)s", *cookie_args, url]
+        return await run_extraction(url, cmd, timeout=timeout)
+
+    res = await run_with_cookies(run)
+    if not res or res.returncode != 0:
+        return None
+
+    number = re.compile(r"\d+(\.\d+)?")
+    sizes = []
+    for line in res.stdout:
+        values = line.split()
+        if not values or not number.fullmatch(values[0]):
+            continue
+        size = float(values[0])
+        if parts:
+            duration = float(values[1]) if len(values) > 1 and number.fullmatch(values[1]) else None
+            kept = clips.kept_duration(parts, duration)
+            if kept is not None:
+                size *= min(max(kept / duration, 0), 1)
+        sizes.append(int(size))
+    return sum(sizes) if sizes else None
+
+def _metered(func):
+    """Count a download function's jobs, results and running count in metrics."""
+    @functools.wraps(func)
+    async def wrapper(url, *args, **kwargs):
+        metrics.JOBS_STARTED.inc(site=metrics.site_label(site_for(url)))
+        metrics.ACTIVE_DOWNLOADS.inc()
+        try:
+            result = await func(url, *args, **kwargs)
+        finally:
+            metrics.ACTIVE_DOWNLOADS.dec()
+        metrics.record_download(result)
+        return result
+    return wrapper
+
+@_metered
+async def download(url, output_dir=".", mode="video", quality=None, format_id=None,
+                   output_template=None, extra_args=None, tool=None,
+                   progress=None, on_output=None, timeout=None, scratch_dir=None, profile=None,
+                   overwrite=True, sections=None, cut=clips.DEFAULT_CUT, background=None):
+    """
+    Download a link into output_dir.
+
+    tool defaults to svtplay-dl for svtplay.se links and yt-dlp otherwise.
+    profile names the download profile (default config.PROFILE) that picks
+    subtitles, max height, codec, embedding and fragment concurrency for the
+    link's site and mode; extra_args are added after it.
+    sections ("10:00-12:30, Intro", see src/clips.py) downloads only those
+    time ranges and chapters, one file per section, cut "fast" (at
+    keyframes) or "accurate" (re-encoded at the cut points).
+    progress(Progress) is called on progress updates and on_output(line,
+    stream) for any other tool output.
+    With a scratch_dir (default config.SCRATCH_DIR) the download and all
+    post-processing happen there and finished files are moved atomically
+    into output_dir. overwrite=False never replaces a file in output_dir
+    (a clashing name gets a " (2)" suffix), for output trees shared by
+    several workers.
+    background (a priority.Policy, see src/priority.py) runs the tools at
+    lower CPU/I/O priority and makes CPU-heavy jobs wait for one of its
+    slots; without it they run at normal priority.
+    Returns a DownloadResult.
+    """
+    result = DownloadResult(url=url, site=site_for(url))
+    if not is_valid_url(url):
+        result.error = "invalid link"
+        return result
+
+    try:
+        settings = await asyncio.to_thread(profiles.resolve, profile, result.site, mode)
+    except ValueError as e:
+        result.error = str(e)
+        return result
+
+    tool = tool or ("svtplay-dl" if result.site == "svtplay" else "yt-dlp")
+    if sections:
+        if tool == "svtplay-dl":
+            result.error = "partial downloads need yt-dlp, svtplay-dl only fetches whole episodes"
+            return result
+        if cut not in clips.CUT_MODES:
+            result.error = f"unknown cut mode: {cut}"
+            return result
+        parts, _, error = await resolve_sections(url, sections, timeout=timeout)
+        if error:
+            result.error = error
+            return result
+        extra_args = clips.ytdlp_args(parts, cut) + list(extra_args or [])
+    output_template = output_template or (clips.OUTPUT_TEMPLATE if sections else "%(title)s.%(ext)s")
+    output_dir = Path(output_dir)
+    scratch_dir = scratch_dir or config.SCRATCH_DIR
+
+    # svtplay-dl doesn't report where it saved, so it always gets a private
+    # folder (parallel jobs share output_dir). yt-dlp only needs one when the
+    # work should happen on scratch or existing files must be kept.
+    staging = None
+    if scratch_dir or tool == "svtplay-dl" or not overwrite:
+        base = Path(scratch_dir or output_dir)
+        base.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".quicktube-", dir=base))
+    work_dir = staging or output_dir
+    cpu_slot = contextlib.nullcontext()
+    if background and priority.is_cpu_heavy(mode, sections, cut):
+        cpu_slot = metrics.slot(background.cpu_slots(), "cpu")
+
+    try:
+        async with cpu_slot:
+            if tool == "svtplay-dl":
+                res = await _run_svtplay(url, work_dir, mode, settings, extra_args, progress, on_output, timeout,
+                                         background)
+            else:
+                res = await _run_ytdlp(url, work_dir, mode, quality, format_id, output_template, extra_args,
+                                       settings, progress, on_output, timeout, background)
+        if tool != "svtplay-dl" and res:
+            result.files = parse_results(res.stdout)
+
+        if staging and res:
+            # Keep whatever finished, even if part of a playlist failed
+            moved = await asyncio.to_thread(finalize, staging, output_dir, overwrite)
+            if tool == "svtplay-dl":
+                result.files = [MediaFile(path=dest, size=os.path.getsize(dest)) for dest in moved.values()]
+            else:
+                for f in result.files:
+                    f.path = moved.get(str(Path(f.path).resolve()), f.path)
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    if res is None:
+        result.error = "command not found"
+        return result
+
+    result.returncode = res.returncode
+    result.elapsed = res.elapsed
+    result.timed_out = res.timed_out
+    result.ok = res.returncode == 0 and not res.timed_out
+    if res.timed_out:
+        result.error = f"timed out after {timeout}s"
+    elif not result.ok:
+        result.error = last_error(res.stderr)
+    return result
+
+async def _run_ytdlp(url, work_dir, mode, quality, format_id, output_template, extra_args,
+                     settings, progress, on_output, timeout, background=None):
+    def on_line(line, stream):
+        p = parse_progress(url, line)
+        if p:
+            if progress: progress(p)
+            return True
+        if on_output and not line.startswith("{"):
+            on_output(line, stream)
+        return False
+
+    async def run(cookie_args):
+        cmd = await asyncio.to_thread(
+            build_ytdlp_download_cmd, url, work_dir, mode, quality, format_id, output_template, extra_args, settings,
+            cookie_args
+        )
+        # --print implies --quiet/--simulate, so ask for progress and the download explicitly
+        cmd[-1:-1] = ["--no-simulate", "--print", RESULT_TEMPLATE,
+                      "--progress", "--newline", "--progress-template", PROGRESS_TEMPLATE]
+        return await run_tool(cmd, timeout=timeout, on_line=on_line, background=background)
+
+    return await run_with_cookies(run)
+
+async def _run_svtplay(url, work_dir, mode, settings, extra_args, progress, on_output, timeout, background=None):
+    cmd = ["svtplay-dl", *settings.svtplay_args(mode), *(extra_args or []), url]
+
+    def on_line(line, stream):
+        match = SVT_PROGRESS.search(line)
+        if match:
+            if progress:
+                done, total = int(match.group(1)), int(match.group(2))
+                progress(Progress(url=url, status="downloading", downloaded_bytes=done, total_bytes=total))
+            return True
+        if on_output and line.strip():
+            on_output(line, stream)
+        return False
+
+    return await run_tool(cmd, cwd=work_dir, timeout=timeout, on_line=on_line, background=background)
+
+async def preflight(urls, output_dir, mode="video", quality=None, jobs=1, scratch_dir=None, profile=None,
+                    sections=None):
+    """
+    Estimate sizes for all links and check them against free space.
+    Returns (sizes, refused, budget): estimated bytes per 1-based index,
+    {index: reason} for links that won't fit at the destination, and a
+    SpaceBudget for scratch (None without a scratch dir).
+    Unknown sizes count as DEFAULT_ESTIMATE so a batch can't silently overrun.
+    """
+    semaphore = asyncio.Semaphore(max(1, int(jobs or 1)))
+
+    async def one(url):
+        if not is_valid_url(url):
+            return 0
+        async with semaphore:
+            try:
+                size = await estimate_size(url, mode, quality, profile=profile, sections=sections)
+            except ValueError:
+                size = None # unknown profile, the download itself reports it
+        return size if size is not None else DEFAULT_ESTIMATE[mode or "video"]
+
+    estimates = await asyncio.gather(*(one(url) for url in urls))
+    sizes = dict(enumerate(estimates, 1))
+
+    refused = {}
+    dest_free = free_space(output_dir)
+    if dest_free is not None:
+        available = dest_free - SPACE_MARGIN
+        for i, size in sizes.items():
+            if size > available:
+                refused[i] = f"not enough space at destination (needs ~{size} bytes, {max(available, 0)} left)"
+            else:
+                available -= size
+
+    budget = None
+    if scratch_dir:
+        scratch_free = free_space(scratch_dir)
+        if scratch_free is not None:
+            budget = SpaceBudget(max(scratch_free - SPACE_MARGIN, 0))
+
+    write_log(f"Preflight: {sum(sizes.values())} bytes estimated for {len(urls)} links, "
+              f"{len(refused)} refused", console=False)
+    return sizes, refused, budget
+
+async def download_many(urls, output_dir=".", mode="video", quality=None, jobs=1,
+                        on_start=None, on_result=None, check_space=False, scratch_dir=None, profile=None,
+                        sections=None, **kwargs):
+    """
+    Download several links with at most `jobs` running at once.
+    on_start(i, url) / on_result(i, DownloadResult) use 1-based indexes.
+    With check_space=True sizes are estimated first: links that would not fit
+    at the destination are refused, and jobs wait for scratch space instead
+    of overfilling it.
+    Returns the results in link order.
+    """
+    semaphore = asyncio.Semaphore(max(1, int(jobs or 1)))
+    scratch_dir = scratch_dir or config.SCRATCH_DIR
+    sizes, refused, budget = {}, {}, None
+    if check_space:
+        sizes, refused, budget = await preflight(urls, output_dir, mode, quality, jobs, scratch_dir, profile,
+                                                 sections)
+
+    async def one(i, url):
+        async with metrics.slot(semaphore, "batch"):
+            if i in refused:
+                result = DownloadResult(url=url, site=site_for(url), error=refused[i])
+                metrics.record_download(result)
+                if on_result: on_result(i, result)
+                return result
+
+            reserve = sizes.get(i, 0) * SCRATCH_FACTOR if budget else 0
+            if reserve:
+                try:
+                    await budget.acquire(reserve)
+                except OSError as e:
+                    result = DownloadResult(url=url, site=site_for(url), error=f"not enough scratch space: {e}")
+                    metrics.record_download(result)
+                    if on_result: on_result(i, result)
+                    return result
+            try:
+                if on_start: on_start(i, url)
+                result = await download(url, output_dir, mode, quality=quality, scratch_dir=scratch_dir,
+                                        profile=profile, sections=sections, **kwargs)
+            finally:
+                if reserve:
+                    await budget.release(reserve)
+            if on_result: on_result(i, result)
+            return result
+
+    return await asyncio.gather(*(one(i, url) for i, url in enumerate(urls, 1)))
+
+def safe_filename(title):
+    return re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", title).strip(" .") or "video"
+
+def _is_mpegts(head):
+    return len(head) > 188 and head[0] == 0x47 and head[188] == 0x47
+
+@_metered
+async def watch_and_keep(url, output_dir=".", audio_only=False, quality=None, progress=None,
+                         on_output=None, timeout=None, scratch_dir=None, profile=None, overwrite=True):
+    """
+    Play a link in mpv while downloading it once into output_dir.
+
+    yt-dlp writes the media to a pipe (merged into Matroska when video and
+    audio come separately). Every chunk is appended to a file in a staging
+    folder, and mpv is fed from that file at its own pace, so playback never
+    slows the download down. Closing mpv only ends the playback, the download
+    carries on. The file is moved into output_dir once both are done.
+    Profile extras that need post-processing (embedded thumbnail, metadata,
+    subtitles) don't apply to piped downloads.
+    Returns a DownloadResult.
+    """
+    result = DownloadResult(url=url, site=site_for(url))
+    if not is_valid_url(url):
+        result.error = "invalid link"
+        return result
+
+    mode = "audio" if audio_only else "video"
+    try:
+        settings = await asyncio.to_thread(profiles.resolve, profile, result.site, mode)
+    except ValueError as e:
+        result.error = str(e)
+        return result
+
+    def build_cmd(cookie_args):
+        cmd = ytdlp_base_cmd(cookie_args)
+        if audio_only:
+            cmd.extend(["-f", "bestaudio/best"])
+        else:
+            cmd.extend(["-f", video_format(quality or settings.max_height, settings.codec)])
+            if settings.codec:
+                cmd.extend(["-S", f"vcodec:{settings.codec}"])
+        cmd.extend(["--merge-output-format", "mkv", "-o", "-", "--no-simulate", "--print", KEEP_TEMPLATE,
+                    "--progress", "--newline", "--progress-template", PROGRESS_TEMPLATE, url])
+        return cmd
+
+    output_dir = Path(output_dir)
+    base = Path(scratch_dir or config.SCRATCH_DIR or output_dir)
+    base.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".quicktube-", dir=base))
+    part = staging / "watch.part"
+
+    info = {}
+    head = b""
+    written = 0
+    finished = False
+    grew = asyncio.Event()
+    out = None
+    last = None
+
+    def on_line(line, stream):
+        p = parse_progress(url, line)
+        if p:
+            if progress: progress(p)
+            return True
+        if line.startswith(KEEP_PREFIX):
+            try:
+                info.update(json.loads(line[len(KEEP_PREFIX):]))
+            except json.JSONDecodeError:
+                pass
+            return True
+        if on_output: on_output(line, stream)
+        return False
+
+    async def on_data(chunk):
+        nonlocal head, written
+        if len(head) < 376:
+            head += chunk[:376 - len(head)]
+        await asyncio.to_thread(out.write, chunk)
+        written += len(chunk)
+        grew.set()
+
+    async def play():
+        while written < PLAYER_PREBUFFER and not finished:
+            grew.clear()
+            await grew.wait()
+        if not written:
+            return
+        player_cmd = ["mpv", "--no-terminal", "--force-window=immediate", "--no-video", "-"] if audio_only \
+            else ["mpv", "--no-terminal", f"--title={info.get('title') or url}", "-"]
+        try:
+            player = await asyncio.create_subprocess_exec(*player_cmd, stdin=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            write_log("Command not found: mpv, downloading only", console=False)
+            return
+        try:
+            with open(part, "rb") as f:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, 1024 * 1024)
+                    if chunk:
+                        player.stdin.write(chunk)
+                        await player.stdin.drain()
+                        continue
+                    if finished:
+                        break
+                    grew.clear()
+                    if f.tell() < written: # arrived between the read and clear()
+                        continue
+                    await grew.wait()
+            player.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            write_log("mpv was closed, the download continues", console=False)
+        except asyncio.CancelledError:
+            await _kill(player)
+            raise
+        await player.wait()
+
+    async def run(cookie_args):
+        nonlocal out, last
+        # Retrying once media arrived would restart what mpv is already playing
+        if last is not None and written:
+            return last
+        with open(part, "wb", buffering=0) as out:
+            last = await run_tool(build_cmd(cookie_args), timeout=timeout, on_line=on_line, on_data=on_data)
+        return last
+
+    watcher = asyncio.create_task(play())
+    try:
+        res = await run_with_cookies(run)
+        finished = True
+        grew.set()
+        # Keep the file in staging until mpv is done with it
+        await watcher
+
+        if res is None:
+            result.error = "command not found"
+            return result
+        result.returncode = res.returncode
+        result.elapsed = res.elapsed
+        result.timed_out = res.timed_out
+        result.ok = res.returncode == 0 and not res.timed_out and written > 0
+        if result.ok:
+            ext = "ts" if _is_mpegts(head) else info.get("ext") or "mkv"
+            name = f"{safe_filename(info.get('title') or info.get('id') or 'video')}.{ext}"
+            dest = await asyncio.to_thread(atomic_move, part, output_dir / name, overwrite)
+            result.files = [MediaFile(path=str(dest), size=written, title=info.get("title"), id=info.get("id"))]
+        elif res.timed_out:
+            result.error = f"timed out after {timeout}s"
+        else:
+            result.error = last_error(res.stderr) or "nothing was downloaded"
+        return result
+    finally:
+        if not watcher.done():
+            watcher.cancel()
+        shutil.rmtree(staging, ignore_errors=True)
+
+async def stream(url, audio_only=False, timeout=None):
+    """Play a link in mpv. mpv keeps the terminal so its keyboard controls work."""
+    cmd = ["mpv", "--no-video", url] if audio_only else ["mpv", "--no-terminal", url]
+    return await run_tool(cmd, timeout=timeout, capture=False)
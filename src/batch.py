@@ -1,21 +1,46 @@
 import os
 import sys
 from pathlib import Path
-from src.ui import gum_style, gum_choose
-from src.core import download_youtube_silent, download_svtplay_silent, is_valid_url
+from src.ui import gum_style, gum_choose, gum_progress
+from src import api
+from src import profiles
+from src import router
+from src import metrics
+from src import priority
+import src.config as config
+from src.api import is_valid_url, run_sync
 from InquirerPy import inquirer
 
+def read_links(file_path):
+    """Read links from a file, ignoring empty lines and # comments."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        raw_lines = f.readlines()
+    return [line.strip() for line in raw_lines if line.strip() and not line.strip().startswith("#")]
+
+def run_batch(links, output_dir, mode="video", quality=None, jobs=1, on_start=None, on_result=None, **kwargs):
+    """
+    Download all links into output_dir using up to `jobs` parallel downloads.
+    on_start(i, url) / on_result(i, result) are called as links start and finish.
+    Pass background=priority.background() to run them at background priority.
+    Returns the list of api.DownloadResult in link order.
+    """
+    return run_sync(api.download_many(
+        links, output_dir, mode, quality=quality, jobs=jobs,
+        on_start=on_start, on_result=on_result, **kwargs
+    ))
+
 def handle_batch_download(file_path=None):
     """
     Handle batch downloading from a file.
     If file_path is None, prompt user to select a file.
     """
-    
+    interactive = sys.stdin.isatty()
+
     # 1. Select File if not provided
     if not file_path:
         print("")
         gum_style("Enter the path to your link file (e.g. links.txt):", foreground="240")
-        
+
         # Simple text input. Drag & drop usually works in terminals.
         file_path = inquirer.text(
             message="",
@@ -24,7 +49,7 @@ def handle_batch_download(file_path=None):
             validate=lambda x: len(x) > 0 and os.path.isfile(x),
             invalid_message="File not found"
         ).execute()
-        
+
         if not file_path: return
 
     # Verify file (double check if passed via arg)
@@ -32,21 +57,32 @@ def handle_batch_download(file_path=None):
         gum_style(f"File not found: {file_path}", foreground="196")
         return
 
-    # 2. Select Mode
-    mode_choice = gum_choose(
-        ["Video (Best Quality)", "Audio (Opus/MP3)"], 
-        header="Download mode for all links?"
-    )
-    
+    # 2. Select Mode (no one to ask without a terminal, use the default)
+    if interactive:
+        mode_choice = gum_choose(
+            ["Video (Best Quality)", "Audio (Opus/MP3)"],
+            header="Download mode for all links?"
+        )
+    else:
+        mode_choice = "Video (Best Quality)"
+
     if mode_choice is None: return
-    
+
     mode = "video" if "Video" in mode_choice else "audio"
 
+    # Profile for the whole batch, only asked when there is a choice
+    profile = config.PROFILE
+    names = profiles.profile_names()
+    if interactive and len(names) > 1:
+        choices = [profile] + [name for name in names if name != profile]
+        profile = gum_choose(choices, header="Download profile for all links?")
+        if profile is None: return
+
     # 3. Prepare Output Directory
     # Name folder same as filename without extension
     input_path = Path(file_path).resolve()
     output_dir = input_path.parent / input_path.stem
-    
+
     try:
         output_dir.mkdir(parents=True, exist_ok=True)
         gum_style(f"Output directory: {output_dir}", foreground="212")
@@ -56,42 +92,59 @@ def handle_batch_download(file_path=None):
 
     # 4. Read Links
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # Ignore lines starting with # or empty
-            raw_lines = f.readlines()
+        links = read_links(file_path)
     except Exception as e:
         gum_style(f"Error reading file: {e}", foreground="196")
         return
-    
-    links = [line.strip() for line in raw_lines if line.strip() and not line.strip().startswith("#")]
-    
+
     if not links:
         gum_style("No valid links found in file.", foreground="196")
         return
 
+    links, duplicates = router.dedupe(links)
+    if duplicates:
+        gum_style(f"Skipping {len(duplicates)} duplicate links.", foreground="240")
+
     gum_style(f"Found {len(links)} links. Starting batch download...", foreground="212")
     print("")
 
     # 5. Process
-    for i, url in enumerate(links, 1):
-        # Validate URL vaguely
-        if not is_valid_url(url):
-            gum_style(f"[{i}/{len(links)}] Skipping invalid link: {url}", foreground="240")
-            continue
-
-        gum_style(f"[{i}/{len(links)}] Processing: {url}", foreground="212")
-        
-        if "svtplay.se" in url:
-            res = download_svtplay_silent(url, output_dir, mode)
-        else:
-            res = download_youtube_silent(url, output_dir, mode)
-            
-        if res.returncode == 0:
+    def on_start(i, url):
+        if is_valid_url(url):
+            gum_style(f"[{i}/{len(links)}] Processing: {url}", foreground="212")
+
+    def on_result(i, result):
+        if result.error == "invalid link":
+            # Validate URL vaguely
+            gum_style(f"[{i}/{len(links)}] Skipping invalid link: {result.url}", foreground="240")
+            return
+        if result.ok:
             gum_style("✔ Done", foreground="212")
+        elif result.error:
+            gum_style(f"❌ Failed: {result.error}", foreground="196")
         else:
             gum_style("❌ Failed", foreground="196")
         print("")
 
+    if config.SCRATCH_DIR:
+        gum_style(f"Working in scratch directory: {config.SCRATCH_DIR}", foreground="240")
+    if config.PREFLIGHT:
+        gum_style("Estimating sizes and checking free space...", foreground="240")
+
+    background = priority.background()
+    with metrics.exporting():
+        results = run_batch(links, output_dir, mode, on_start=on_start, on_result=on_result,
+                            progress=gum_progress, check_space=config.PREFLIGHT, profile=profile,
+                            background=background)
+
     gum_style("Batch processing complete!", foreground="212")
-    if not sys.argv[1:]: # Only pause if interactive
+    invalid = sum(1 for r in results if r.error == "invalid link")
+    attempted = len(results) - invalid
+    succeeded = sum(1 for r in results if r.ok)
+    gum_style(f"{succeeded} of {attempted} links downloaded.",
+              foreground="212" if succeeded == attempted else "196")
+    if invalid:
+        gum_style(f"Skipped {invalid} invalid link{'s' if invalid != 1 else ''}.", foreground="240")
+    gum_style(f"Ran at {background.describe()}", foreground="240")
+    if not sys.argv[1:] and interactive: # Only pause if interactive
         input("Press Enter to continue...")
@@ -0,0 +1,396 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+from dataclasses import asdict
+from pathlib import Path
+
+import src.config as config
+from src import api
+from src import updater
+from src import profiles
+from src import subscriptions
+from src import router
+from src import clips
+from src import metrics
+from src import priority
+from src import workqueue
+from src.api import is_valid_url, site_for, run_sync
+from src.formats import best_per_height
+from src.batch import read_links
+
+# Exit codes for scripted use
+EXIT_OK = 0
+EXIT_FAILED = 1          # at least one link failed / info could not be fetched
+EXIT_USAGE = 2           # bad arguments (argparse uses 2 as well)
+EXIT_MISSING_DEPS = 3    # yt-dlp/svtplay-dl/ffmpeg not found
+
+COMMANDS = ["get", "info", "update", "subscribe", "unsubscribe", "sync", "worker"]
+
+def emit(data):
+    """Write a JSON result to stdout."""
+    json.dump(data, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+def fail(message, code, **extra):
+    emit({"ok": False, "error": message, **extra})
+    return code
+
+def require(dependencies):
+    missing = config.find_missing_dependencies(dependencies, clipboard=False)
+    if missing:
+        return fail(f"Missing dependencies: {', '.join(missing)}", EXIT_MISSING_DEPS, missing=missing)
+    return None
+
+def cmd_get(args):
+    links = list(args.urls)
+    if args.file:
+        try:
+            links.extend(read_links(args.file))
+        except OSError as e:
+            return fail(f"Error reading file: {e}", EXIT_USAGE)
+    if not links:
+        return fail("No links given", EXIT_USAGE)
+
+    deps = ["yt-dlp", "ffmpeg"]
+    links, duplicates = router.dedupe(links)
+    if any(site_for(url) == "svtplay" for url in links):
+        deps.append("svtplay-dl")
+    missing = require(deps)
+    if missing is not None:
+        return missing
+
+    if args.profile and args.profile not in profiles.profile_names():
+        return fail(f"Unknown profile: {args.profile}", EXIT_USAGE, profiles=profiles.profile_names())
+    if args.sections:
+        try:
+            clips.parse_spec(args.sections)
+        except ValueError as e:
+            return fail(str(e), EXIT_USAGE, sections=args.sections)
+
+    output_dir = Path(args.out).resolve()
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        return fail(f"Could not create directory: {e}", EXIT_FAILED)
+
+    background = background_policy(args)
+    start = time.monotonic()
+    with metrics.exporting(args.metrics_file, args.metrics_port):
+        results = run_sync(api.download_many(
+            links, output_dir, args.mode, quality=args.quality, jobs=args.jobs, timeout=args.timeout,
+            scratch_dir=args.scratch, check_space=args.preflight or config.PREFLIGHT, profile=args.profile,
+            sections=args.sections, cut=args.cut, background=background
+        ))
+
+    succeeded = sum(1 for r in results if r.ok)
+    files = [f for r in results for f in r.files]
+    emit({
+        "ok": succeeded == len(results),
+        "command": "get",
+        "mode": args.mode,
+        "quality": args.quality,
+        "profile": args.profile or config.PROFILE,
+        "sections": args.sections,
+        "cut": args.cut if args.sections else None,
+        "out": str(output_dir),
+        "results": [asdict(r) for r in results],
+        "summary": {
+            "total": len(results),
+            "duplicates": len(duplicates),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "files": len(files),
+            "bytes": sum(f.size or 0 for f in files),
+            "elapsed": round(time.monotonic() - start, 3),
+            "priority": background.summary(),
+        },
+    })
+    return EXIT_OK if succeeded == len(results) else EXIT_FAILED
+
+def cmd_info(args):
+    if not is_valid_url(args.url):
+        return fail("Not a YouTube or SVT Play link", EXIT_USAGE, url=args.url)
+    missing = require(["yt-dlp"])
+    if missing is not None:
+        return missing
+
+    result = run_sync(api.probe(args.url, formats=not args.no_formats, timeout=args.timeout))
+    if not result.ok:
+        return fail(result.error, EXIT_FAILED, url=args.url)
+
+    data = {"ok": True, "command": "info", "url": args.url, "title": result.title}
+
+    if result.is_playlist:
+        data.update({
+            "type": "playlist",
+            "count": len(result.entries),
+            "entries": [
+                {k: e.get(k) for k in ("id", "title", "url", "duration", "playlist_index")}
+                for e in result.entries
+            ],
+        })
+    else:
+        data.update({"type": "video", "id": result.id, "duration": result.duration})
+        if not args.no_formats:
+            data["formats"] = [asdict(f) for f in result.formats]
+            data["qualities"] = [f.height for f in best_per_height(result.formats)]
+
+    emit(data)
+    return EXIT_OK
+
+def cmd_update(args):
+    bin_dir = config.get_user_bin_dir()
+    results = [updater.update_ytdlp(bin_dir, check_only=args.check)]
+    if platform.system() == "Windows":
+        results.append(updater.update_svtplay_windows(bin_dir, check_only=args.check))
+
+    ok = all(r.ok for r in results)
+    emit({"ok": ok, "command": "update", "bin_dir": bin_dir, "results": [asdict(r) for r in results]})
+    return EXIT_OK if ok else EXIT_FAILED
+
+def cmd_subscribe(args):
+    if not is_valid_url(args.url):
+        return fail("Not a YouTube or SVT Play link", EXIT_USAGE, url=args.url)
+    if args.profile and args.profile not in profiles.profile_names():
+        return fail(f"Unknown profile: {args.profile}", EXIT_USAGE, profiles=profiles.profile_names())
+    missing = require(["yt-dlp"])
+    if missing is not None:
+        return missing
+
+    output_dir = str(Path(args.out).resolve()) if args.out else None
+    sub, error = run_sync(subscriptions.subscribe(
+        args.url, output_dir, args.mode, profile=args.profile, skip_existing=args.skip_existing,
+        timeout=args.timeout
+    ))
+    if error:
+        return fail(error, EXIT_FAILED, url=args.url)
+    data = asdict(sub)
+    data["known"] = len(sub.known)
+    data["pending"] = len(sub.pending)
+    emit({"ok": True, "command": "subscribe", "subscription": data})
+    return EXIT_OK
+
+def cmd_unsubscribe(args):
+    if not subscriptions.unsubscribe(args.url):
+        return fail("Not subscribed", EXIT_FAILED, url=args.url)
+    emit({"ok": True, "command": "unsubscribe", "url": args.url})
+    return EXIT_OK
+
+def cmd_sync(args):
+    subs = subscriptions.load_subscriptions()
+    if args.list:
+        emit({"ok": True, "command": "sync", "subscriptions": [
+            {**asdict(sub), "known": len(sub.known), "pending": len(sub.pending)} for sub in subs
+        ]})
+        return EXIT_OK
+
+    deps = ["yt-dlp", "ffmpeg"]
+    if any(site_for(sub.url) == "svtplay" for sub in subs):
+        deps.append("svtplay-dl")
+    missing = require(deps)
+    if missing is not None:
+        return missing
+
+    background = background_policy(args)
+    start = time.monotonic()
+    with metrics.exporting(args.metrics_file, args.metrics_port):
+        results = run_sync(subscriptions.sync_all(subs, jobs=args.jobs, dry_run=args.dry_run, timeout=args.timeout,
+                                                  background=background))
+
+    ok = all(r.ok for r in results)
+    emit({
+        "ok": ok,
+        "command": "sync",
+        "dry_run": args.dry_run,
+        "results": [asdict(r) for r in results],
+        "summary": {
+            "subscriptions": len(results),
+            "new": sum(len(r.new) for r in results),
+            "retried": sum(len(r.retried) for r in results),
+            "given_up": sum(len(r.given_up) for r in results),
+            "downloaded": sum(1 for r in results for d in r.downloads if d.ok),
+            "failed": sum(1 for r in results for d in r.downloads if not d.ok),
+            "listing_errors": sum(1 for r in results if r.error and not r.downloads),
+            "elapsed": round(time.monotonic() - start, 3),
+            "priority": background.summary(),
+        },
+    })
+    return EXIT_OK if ok else EXIT_FAILED
+
+def cmd_worker(args):
+    try:
+        links = read_links(args.file)
+    except OSError as e:
+        return fail(f"Error reading file: {e}", EXIT_USAGE)
+    if not links:
+        return fail("No links given", EXIT_USAGE)
+
+    deps = ["yt-dlp", "ffmpeg"]
+    if any(site_for(url) == "svtplay" for url in links):
+        deps.append("svtplay-dl")
+    missing = require(deps)
+    if missing is not None:
+        return missing
+
+    if args.profile and args.profile not in profiles.profile_names():
+        return fail(f"Unknown profile: {args.profile}", EXIT_USAGE, profiles=profiles.profile_names())
+
+    # Same layout as a batch download: a folder named after the links file
+    input_path = Path(args.file).resolve()
+    output_dir = Path(args.out).resolve() if args.out else input_path.parent / input_path.stem
+    work_dir = Path(args.work_dir).resolve() if args.work_dir else workqueue.default_work_dir(output_dir)
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        return fail(f"Could not create directory: {e}", EXIT_FAILED)
+
+    background = background_policy(args)
+    start = time.monotonic()
+    with metrics.exporting(args.metrics_file, args.metrics_port):
+        worker = run_sync(workqueue.run_worker(
+            links, output_dir, args.mode, quality=args.quality, jobs=args.jobs, work_dir=work_dir,
+            worker_id=args.id, lease_ttl=args.lease, max_attempts=args.max_attempts, timeout=args.timeout,
+            scratch_dir=args.scratch, profile=args.profile, background=background
+        ))
+
+    succeeded = sum(1 for r in worker.results if r.ok)
+    status = worker.status
+    emit({
+        "ok": status.failed == 0,
+        "command": "worker",
+        "worker": worker.worker,
+        "mode": args.mode,
+        "quality": args.quality,
+        "profile": args.profile or config.PROFILE,
+        "out": str(output_dir),
+        "work_dir": str(work_dir),
+        "results": [asdict(r) for r in worker.results],
+        "summary": {
+            "ran": len(worker.results),
+            "succeeded": succeeded,
+            "failed": len(worker.results) - succeeded,
+            "taken_over": worker.taken_over,
+            "lost": worker.lost,
+            "elapsed": round(time.monotonic() - start, 3),
+            "priority": background.summary(),
+        },
+        "batch": asdict(status),
+    })
+    return EXIT_OK if status.failed == 0 else EXIT_FAILED
+
+def add_priority_arguments(parser):
+    parser.add_argument("--nice", type=int, help="Nice increment for the tools and ffmpeg, 0-19 (default: settings)")
+    parser.add_argument("--ionice", help='I/O class: "best-effort:0".."best-effort:7", "idle" or "none" '
+                                         "(default: settings, Linux only)")
+    parser.add_argument("--cpu-jobs", help='Clips re-encoded for --cut accurate at once, e.g. 2 or "50%%" '
+                                           "of the cores (default: settings)")
+
+def background_policy(args):
+    return priority.background(args.nice, args.ionice, args.cpu_jobs)
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-file",
+                        help="Keep OpenMetrics counters in this file while running (default: settings)")
+    parser.add_argument("--metrics-port", type=int, help="Serve OpenMetrics on 127.0.0.1:PORT/metrics")
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="quicktube",
+        description="QuickTube headless mode. Results are printed as JSON on stdout."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    get = sub.add_parser("get", help="Download one or more links")
+    get.add_argument("urls", nargs="*", help="Links to download")
+    get.add_argument("--file", "-f", help="Read links from a file (one per line)")
+    get.add_argument("--mode", choices=["video", "audio"], default="video")
+    get.add_argument("--quality", type=int, help="Max video height, e.g. 720")
+    get.add_argument("--profile", "-p", help="Download profile from profiles.json (default: the saved one)")
+    get.add_argument("--jobs", "-j", type=int, default=1, help="Parallel downloads")
+    get.add_argument("--out", "-o", default=os.getcwd(), help="Output directory")
+    get.add_argument("--timeout", type=float, help="Give up on a link after this many seconds")
+    get.add_argument("--scratch", help="Fast local directory to download into before moving to --out")
+    get.add_argument("--preflight", action="store_true",
+                     help="Estimate sizes first and refuse/throttle when disk space would run out")
+    get.add_argument("--sections", "-s",
+                     help='Only download these time ranges/chapters, e.g. "10:00-12:30, 1:02:00-, Intro"')
+    get.add_argument("--cut", choices=clips.CUT_MODES, default=clips.DEFAULT_CUT,
+                     help="fast: cut at keyframes without re-encoding; accurate: re-encode at the cut points")
+    add_priority_arguments(get)
+    add_metrics_arguments(get)
+    get.set_defaults(func=cmd_get)
+
+    info = sub.add_parser("info", help="Show information about a link")
+    info.add_argument("url")
+    info.add_argument("--no-formats", action="store_true", help="Skip the format probe for videos")
+    info.add_argument("--timeout", type=float, help="Give up after this many seconds")
+    info.set_defaults(func=cmd_info)
+
+    update = sub.add_parser("update", help="Update yt-dlp (and svtplay-dl on Windows) if a new release exists")
+    update.add_argument("--check", action="store_true", help="Only report whether an update is available")
+    update.set_defaults(func=cmd_update)
+
+    subscribe = sub.add_parser("subscribe", help="Follow a playlist, channel or series for `sync`")
+    subscribe.add_argument("url")
+    subscribe.add_argument("--out", "-o", help="Output directory (default: ./<title>)")
+    subscribe.add_argument("--mode", choices=["video", "audio"], default="video")
+    subscribe.add_argument("--profile", "-p", help="Download profile for this subscription")
+    subscribe.add_argument("--skip-existing", action="store_true",
+                           help="Only download items published after subscribing")
+    subscribe.add_argument("--timeout", type=float, help="Give up listing after this many seconds")
+    subscribe.set_defaults(func=cmd_subscribe)
+
+    unsubscribe = sub.add_parser("unsubscribe", help="Stop following a link")
+    unsubscribe.add_argument("url")
+    unsubscribe.set_defaults(func=cmd_unsubscribe)
+
+    sync = sub.add_parser("sync", help="Download new items of all subscriptions")
+    sync.add_argument("--jobs", "-j", type=int, default=2, help="Parallel listings and downloads")
+    sync.add_argument("--dry-run", action="store_true", help="Only report what is new")
+    sync.add_argument("--list", action="store_true", help="List subscriptions and exit")
+    sync.add_argument("--timeout", type=float, help="Give up on a listing/download after this many seconds")
+    add_priority_arguments(sync)
+    add_metrics_arguments(sync)
+    sync.set_defaults(func=cmd_sync)
+
+    worker = sub.add_parser("worker", help="Work on a links file together with other workers (any host)")
+    worker.add_argument("file", help="Links file (one per line), the same path for every worker")
+    worker.add_argument("--out", "-o", help="Shared output directory (default: <file dir>/<file name>)")
+    worker.add_argument("--work-dir", help=f"Shared claim directory (default: <out>/{workqueue.WORK_DIR_NAME})")
+    worker.add_argument("--mode", choices=["video", "audio"], default="video")
+    worker.add_argument("--quality", type=int, help="Max video height, e.g. 720")
+    worker.add_argument("--profile", "-p", help="Download profile from profiles.json (default: the saved one)")
+    worker.add_argument("--jobs", "-j", type=int, default=1, help="Parallel downloads in this worker")
+    worker.add_argument("--lease", type=float, default=workqueue.LEASE_TTL,
+                        help="Seconds before a dead worker's links are taken over")
+    worker.add_argument("--max-attempts", type=int, default=workqueue.MAX_ATTEMPTS,
+                        help="Failed downloads of a link (by any worker) before it is given up")
+    worker.add_argument("--id", help="Worker name in the claim files (default: <host>-<pid>-<random>)")
+    worker.add_argument("--timeout", type=float, help="Give up on a link after this many seconds")
+    worker.add_argument("--scratch", help="Fast local directory to download into before moving to --out")
+    add_priority_arguments(worker)
+    add_metrics_arguments(worker)
+    worker.set_defaults(func=cmd_worker)
+
+    return parser
+
+def run_cli(argv):
+    """Entry point for `quicktube <command> ...`. Returns the exit code."""
+    args = build_parser().parse_args(argv)
+    if args.command in ("get", "sync", "worker") and args.jobs < 1:
+        return fail("--jobs must be at least 1", EXIT_USAGE)
+    if args.command == "worker" and (args.lease <= 0 or args.max_attempts < 1):
+        return fail("--lease must be positive and --max-attempts at least 1", EXIT_USAGE)
+    if args.command in ("get", "sync", "worker"):
+        if args.nice is not None and not 0 <= args.nice <= 19:
+            return fail("--nice must be between 0 and 19", EXIT_USAGE)
+        if args.ionice is not None and args.ionice != "none" and not priority.parse_ionice(args.ionice):
+            return fail(f"Unknown ionice class: {args.ionice}", EXIT_USAGE)
+        if args.cpu_jobs is not None and not re.fullmatch(r"[1-9]\d*%?", args.cpu_jobs.strip()):
+            return fail(f"--cpu-jobs must be a number or a percentage of the cores: {args.cpu_jobs}", EXIT_USAGE)
+    return args.func(args)
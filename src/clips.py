@@ -0,0 +1,127 @@
+"""
+Partial downloads.
+
+A section spec is a comma-separated list of time ranges and chapter names:
+
+    "10:00-12:30, 1:02:00-1:05:00, Intro"
+
+Times are seconds, m:ss or h:mm:ss; an open end ("1:30:00-") runs to the
+end of the video. Chapter names come from the video's metadata and match
+case-insensitively, exactly or as the only chapter containing the text.
+yt-dlp then only fetches the kept sections (--download-sections), so
+transfer and storage follow the kept duration. Cuts are either "fast"
+(stream copy, the cut lands on the nearest keyframe) or "accurate"
+(--force-keyframes-at-cuts, re-encodes around each cut).
+"""
+import re
+from dataclasses import dataclass
+
+CUT_MODES = ("fast", "accurate")
+DEFAULT_CUT = "fast"
+
+# One file per section, named after where it starts and ends
+OUTPUT_TEMPLATE = "%(title)s [%(section_start>%H.%M.%S)s-%(section_end>%H.%M.%S)s].%(ext)s"
+
+TIME = r"\d+(?::\d{1,2}){0,2}(?:\.\d+)?"
+RANGE = re.compile(rf"({TIME})?\s*-\s*({TIME}|inf)?")
+
+
+@dataclass
+class Section:
+    start: float
+    end: float = None    # None: to the end
+    title: str = None    # chapter title
+
+    def ytdlp_spec(self):
+        end = "inf" if self.end is None else _fmt(self.end)
+        return f"*{_fmt(self.start)}-{end}"
+
+
+def _fmt(seconds):
+    return f"{seconds:g}"
+
+def parse_time(text):
+    """Seconds from "90", "1:30" or "1:01:30.5". Raises ValueError."""
+    seconds = 0.0
+    for part in text.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def format_time(seconds):
+    seconds = int(seconds or 0)
+    h, rest = divmod(seconds, 3600)
+    return f"{h}:{rest // 60:02d}:{rest % 60:02d}" if h else f"{rest // 60}:{rest % 60:02d}"
+
+def parse_spec(spec):
+    """
+    Split a spec into Sections (time ranges) and chapter names (str).
+    spec may be a string or a list of strings. Raises ValueError.
+    """
+    items = spec if isinstance(spec, (list, tuple)) else [spec]
+    parts = [p.strip() for item in items for p in str(item).split(",") if p.strip()]
+    if not parts:
+        raise ValueError("No sections given")
+
+    result = []
+    for part in parts:
+        match = RANGE.fullmatch(part)
+        if not match or not (match.group(1) or match.group(2)):
+            result.append(part)
+            continue
+        start = parse_time(match.group(1)) if match.group(1) else 0.0
+        end = None if match.group(2) in (None, "inf") else parse_time(match.group(2))
+        if end is not None and end <= start:
+            raise ValueError(f"Section ends before it starts: {part}")
+        result.append(Section(start, end))
+    return result
+
+def needs_chapters(parsed):
+    return any(isinstance(item, str) for item in parsed)
+
+def find_chapter(name, chapters):
+    """The chapter called `name`, or the only one containing it."""
+    wanted = name.casefold()
+    exact = [c for c in chapters if (c.get("title") or "").casefold() == wanted]
+    if exact:
+        return exact[0]
+    partial = [c for c in chapters if wanted in (c.get("title") or "").casefold()]
+    if len(partial) == 1:
+        return partial[0]
+    if partial:
+        raise ValueError(f"Chapter name is ambiguous: {name} ({', '.join(c.get('title') for c in partial)})")
+    raise ValueError(f"Unknown chapter: {name}")
+
+def resolve(parsed, chapters=None, duration=None):
+    """
+    Turn parse_spec() output into Sections, looking chapter names up in the
+    video's chapter list. Overlapping sections are kept as given.
+    Raises ValueError for unknown chapters or ranges past the end.
+    """
+    chapters = chapters or []
+    sections = []
+    for item in parsed:
+        if isinstance(item, Section):
+            if duration and item.start >= duration:
+                raise ValueError(f"Section starts after the end of the video ({format_time(duration)})")
+            sections.append(item)
+            continue
+        if not chapters:
+            raise ValueError(f"The video has no chapters (looking for: {item})")
+        chapter = find_chapter(item, chapters)
+        sections.append(Section(float(chapter.get("start_time") or 0), chapter.get("end_time"),
+                                chapter.get("title")))
+    return sections
+
+def kept_duration(sections, duration):
+    """Seconds covered by the sections, None if the video's duration is unknown."""
+    if not duration:
+        return None
+    return sum(min(s.end if s.end is not None else duration, duration) - s.start for s in sections)
+
+def ytdlp_args(sections, cut=DEFAULT_CUT):
+    args = []
+    for s in sections:
+        args.extend(["--download-sections", s.ytdlp_spec()])
+    if cut == "accurate":
+        args.append("--force-keyframes-at-cuts")
+    return args
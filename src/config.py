@@ -1,12 +1,51 @@
 import os
 import sys
+import json
 import shutil
 import platform
-from src.ui import gum_style
 
-# Global setting
+# Global settings
 COOKIE_BROWSER = None
 
+# Local fast directory (SSD/tmpfs) where downloads and post-processing happen
+# before finished files are moved to the destination. None = work in place.
+SCRATCH_DIR = os.environ.get("QUICKTUBE_SCRATCH") or None
+
+# Estimate sizes and check free space before batch downloads
+PREFLIGHT = False
+
+# Download profile used when none is chosen for a job (see src/profiles.py)
+PROFILE = "default"
+
+# OpenMetrics export of batch/sync/worker runs (see src/metrics.py): a textfile
+# rewritten while they run and/or a local HTTP port. None = off.
+def _port(value):
+    try:
+        return int(value or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+METRICS_FILE = os.environ.get("QUICKTUBE_METRICS_FILE") or None
+METRICS_PORT = _port(os.environ.get("QUICKTUBE_METRICS_PORT"))
+
+# Scheduling of batch/sync/worker downloads and their ffmpeg post-processing
+# (see src/priority.py): nice increment, ionice class and how many
+# accurate-cut clips (re-encoded by ffmpeg) may run at once, as a number or
+# share of the cores. Interactive actions keep normal priority.
+BACKGROUND_NICE = 10
+BACKGROUND_IONICE = "best-effort:7"
+CPU_HEAVY_JOBS = "50%"
+
+SETTINGS_FILE = "settings.json"
+
+# settings.json values of the settings an environment variable can
+# override; save_settings writes these back, never a one-off override
+_saved = {}
+
+def _persisted(key, env, value):
+    """Value of setting `key` to save: the loaded one while `env` overrides it."""
+    return _saved.get(key) if os.environ.get(env) else value
+
 def get_user_bin_dir():
     """Return the path to the user's local bin directory depending on OS."""
     system = platform.system()
@@ -31,6 +70,54 @@ def get_user_config_dir():
     else: # Linux (XDG standard ish)
         return os.path.join(home, ".config", "QuickTube")
 
+def get_settings_path():
+    return os.path.join(get_user_config_dir(), SETTINGS_FILE)
+
+def load_settings():
+    """Load persisted settings (e.g. cookie browser) into the module globals."""
+    global COOKIE_BROWSER, SCRATCH_DIR, PREFLIGHT, PROFILE, METRICS_FILE, METRICS_PORT
+    global BACKGROUND_NICE, BACKGROUND_IONICE, CPU_HEAVY_JOBS
+    try:
+        with open(get_settings_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return
+    if isinstance(data, dict):
+        COOKIE_BROWSER = data.get("cookie_browser") or None
+        # The environment variable wins over the saved value
+        _saved["scratch_dir"] = data.get("scratch_dir") or None
+        SCRATCH_DIR = os.environ.get("QUICKTUBE_SCRATCH") or _saved["scratch_dir"]
+        PREFLIGHT = bool(data.get("preflight", False))
+        profile = data.get("profile")
+        PROFILE = profile.strip() if isinstance(profile, str) and profile.strip() else "default"
+        _saved["metrics_file"] = data.get("metrics_file") or None
+        _saved["metrics_port"] = _port(data.get("metrics_port"))
+        METRICS_FILE = os.environ.get("QUICKTUBE_METRICS_FILE") or _saved["metrics_file"]
+        METRICS_PORT = _port(os.environ.get("QUICKTUBE_METRICS_PORT")) or _saved["metrics_port"]
+        BACKGROUND_NICE = data.get("background_nice", BACKGROUND_NICE)
+        BACKGROUND_IONICE = data.get("background_ionice", BACKGROUND_IONICE)
+        CPU_HEAVY_JOBS = data.get("cpu_heavy_jobs", CPU_HEAVY_JOBS)
+
+def save_settings():
+    """Persist the current settings to the config directory."""
+    path = get_settings_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "cookie_browser": COOKIE_BROWSER,
+                "scratch_dir": _persisted("scratch_dir", "QUICKTUBE_SCRATCH", SCRATCH_DIR),
+                "preflight": PREFLIGHT,
+                "profile": PROFILE,
+                "metrics_file": _persisted("metrics_file", "QUICKTUBE_METRICS_FILE", METRICS_FILE),
+                "metrics_port": _persisted("metrics_port", "QUICKTUBE_METRICS_PORT", METRICS_PORT),
+                "background_nice": BACKGROUND_NICE,
+                "background_ionice": BACKGROUND_IONICE,
+                "cpu_heavy_jobs": CPU_HEAVY_JOBS,
+            }, f, indent=2)
+    except OSError:
+        pass # Fail silently
+
 def setup_resources():
     """Configure PATH to include binaries."""
     paths_to_add = []
@@ -55,23 +142,31 @@ def setup_resources():
     if paths_to_add:
         os.environ["PATH"] = os.pathsep.join(paths_to_add) + os.pathsep + os.environ["PATH"]
 
-def check_dependencies():
+def find_missing_dependencies(dependencies=None, clipboard=True):
+    """Return the list of required tools that are not on PATH."""
     missing_deps = []
     # mpv and ffmpeg are expected on the system, gum/yt-dlp/svtplay-dl are bundled or in bin
-    dependencies = ["yt-dlp", "svtplay-dl", "mpv", "ffmpeg"]
+    if dependencies is None:
+        dependencies = ["yt-dlp", "svtplay-dl", "mpv", "ffmpeg"]
     
     for dep in dependencies:
         if not shutil.which(dep):
             missing_deps.append(dep)
     
     # Check clipboard only on Linux
-    if platform.system() == "Linux":
+    if clipboard and platform.system() == "Linux":
         if not shutil.which("wl-paste") and not shutil.which("xclip"):
             missing_deps.append("wl-paste or xclip")
+    return missing_deps
+
+def check_dependencies():
+    missing_deps = find_missing_dependencies()
         
     if missing_deps:
+        # Imported here so config stays usable without the TUI (src.api)
+        from src.ui import gum_style
         gum_style("Error: The following dependencies are missing:", foreground="212")
         for dep in missing_deps:
             print(f"- {dep}")
         gum_style("Please install them and try again.", foreground="212")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
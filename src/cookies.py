@@ -0,0 +1,138 @@
+import os
+import glob
+import time
+import shutil
+import tempfile
+import threading
+
+from src.utils import run_command, write_log
+import src.config as config
+
+# Exported cookies are reused for this long before we read the browser again
+COOKIE_TTL = 6 * 60 * 60
+
+# yt-dlp error fragments that mean our cookies are stale or missing
+AUTH_ERRORS = [
+    "Sign in to confirm",
+    "confirm you're not a bot",
+    "confirm you are not a bot",
+    "members-only",
+    "login required",
+]
+
+_export_lock = threading.Lock()
+
+def get_cookie_file():
+    """Path of the exported cookies.txt for the selected browser."""
+    return os.path.join(config.get_user_config_dir(), f"cookies-{config.COOKIE_BROWSER}.txt")
+
+def cookies_fresh(path):
+    try:
+        return time.time() - os.path.getmtime(path) < COOKIE_TTL and os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+def export_cookies():
+    """
+    Extract cookies from the selected browser once into a private cookies.txt.
+    Returns the path, or None if the export failed.
+    """
+    path = get_cookie_file()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # mkdtemp is private (0700), so the cookies are never world-readable
+        tmp_dir = tempfile.mkdtemp(prefix=".cookies-", dir=os.path.dirname(path))
+    except OSError as e:
+        write_log(f"Could not create cookie file: {e}", console=False)
+        return None
+    tmp_path = os.path.join(tmp_dir, "cookies.txt")
+
+    # yt-dlp complains about the missing URL but still saves the cookie jar
+    run_command(["yt-dlp", "--no-warnings", "--cookies-from-browser", config.COOKIE_BROWSER, "--cookies", tmp_path])
+
+    try:
+        if not os.path.isfile(tmp_path) or os.path.getsize(tmp_path) == 0:
+            raise OSError("no cookies exported")
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+        remove_stale_copies()
+        write_log(f"Exported cookies from {config.COOKIE_BROWSER} to {path}", console=False)
+        return path
+    except OSError as e:
+        write_log(f"Cookie export from {config.COOKIE_BROWSER} failed: {e}", console=False)
+        return None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def remove_stale_copies():
+    """Remove private copies left behind by runs that were killed."""
+    pattern = os.path.join(config.get_user_config_dir(), ".cookies-*.txt")
+    for path in glob.glob(pattern):
+        try:
+            if time.time() - os.path.getmtime(path) > COOKIE_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+def checkout_cookies():
+    """
+    Return (args, exported): the yt-dlp arguments for the selected cookie
+    browser and the export's mtime (None without an export).
+    yt-dlp writes its cookie jar back when it exits, so every call gets a
+    private copy of the shared export. Parallel jobs then can't corrupt the
+    export, and its mtime stays the export time for the TTL.
+    Only falls back to reading the browser directly if the export failed.
+    Pass args to release_cookies() once the tool has exited.
+    """
+    if not config.COOKIE_BROWSER:
+        return [], None
+
+    path = get_cookie_file()
+    if not cookies_fresh(path):
+        with _export_lock:
+            # Another thread may have refreshed it while we waited
+            if not cookies_fresh(path):
+                path = export_cookies()
+
+    if path:
+        try:
+            exported = os.path.getmtime(path)
+            fd, copy = tempfile.mkstemp(prefix=".cookies-", suffix=".txt", dir=os.path.dirname(path))
+            os.close(fd)
+            shutil.copyfile(path, copy)
+            return ["--cookies", copy], exported
+        except OSError as e:
+            write_log(f"Could not copy cookie file: {e}", console=False)
+    return ["--cookies-from-browser", config.COOKIE_BROWSER], None
+
+def release_cookies(args):
+    """Remove the private copy handed out by checkout_cookies()."""
+    if len(args) == 2 and args[0] == "--cookies":
+        try:
+            os.remove(args[1])
+        except OSError:
+            pass
+
+def invalidate_cookies(exported=None):
+    """
+    Drop the exported cookies so the next call extracts them again.
+    With exported (from checkout_cookies) an export that was refreshed since
+    is kept, so parallel jobs rejected by the same stale cookies re-export
+    only once.
+    """
+    if not config.COOKIE_BROWSER:
+        return
+    path = get_cookie_file()
+    with _export_lock:
+        try:
+            if exported is None or os.path.getmtime(path) <= exported:
+                os.remove(path)
+        except OSError:
+            pass
+
+def is_auth_error(stderr):
+    """Check if a yt-dlp error output looks like a cookie/auth problem."""
+    if not stderr:
+        return False
+    lowered = stderr.lower()
+    return any(err.lower() in lowered for err in AUTH_ERRORS)
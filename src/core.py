@@ -1,23 +1,41 @@
 import os
-import sys
-import re
-import json
-import subprocess
-import urllib.request
 import platform
-from pathlib import Path
 
-from src.utils import run_command, write_log
-from src.ui import gum_style, gum_choose, gum_input, gum_table
+from src.utils import write_log
+from src.ui import gum_style, gum_choose, gum_input, gum_progress, gum_output
 import src.config as config
 from src.history import add_to_history
-
-def get_ytdlp_base_cmd():
-    """Return base command for yt-dlp including cookies if selected."""
-    cmd = ["yt-dlp", "--no-warnings", "--embed-metadata", "--embed-thumbnail"]
-    if config.COOKIE_BROWSER:
-        cmd.extend(["--cookies-from-browser", config.COOKIE_BROWSER])
-    return cmd
+from src.formats import best_per_height, format_row
+from src.cookies import invalidate_cookies
+from src import api
+from src import updater
+from src import clips
+from src import metrics
+from src import priority
+from src import profiles
+from src import router
+from src import subscriptions
+from src.api import is_valid_url, site_for, run_sync
+
+def run_download(url, **kwargs):
+    """Run api.download in the foreground with console progress."""
+    result = run_sync(api.download(url, progress=gum_progress, on_output=gum_output, **kwargs))
+    if result.error and not result.ok:
+        write_log(f"Download failed: {url}: {result.error}", console=False)
+    return result
+
+def run_stream(url, audio_only=False):
+    run_sync(api.stream(url, audio_only=audio_only))
+
+def run_watch_and_keep(url, audio_only=False):
+    """Play a link in mpv while saving it from the same download."""
+    result = run_sync(api.watch_and_keep(url, audio_only=audio_only, progress=gum_progress, on_output=gum_output))
+    if result.ok:
+        gum_style(f"✔ Saved {os.path.basename(result.files[0].path)}", foreground="212")
+    else:
+        write_log(f"Watch and keep failed: {url}: {result.error}", console=False)
+        gum_style(f"❌ Download failed: {result.error}", foreground="196")
+    return result
 
 def select_cookie_browser():
     """Select browser for cookies."""
@@ -28,22 +46,95 @@ def select_cookie_browser():
 
     if choice and choice != "None (Default)":
         config.COOKIE_BROWSER = choice
+        # Re-export from the (possibly different) browser on next use
+        invalidate_cookies()
         gum_style(f"Browser selected: {config.COOKIE_BROWSER}", foreground="212")
     else:
         config.COOKIE_BROWSER = None
         gum_style("Cookies disabled.", foreground="212")
 
-def is_valid_url(text):
-    """Simple check if the text looks like a relevant URL."""
-    patterns = [
-        r"https?://(www\.)?youtube\.com/",
-        r"https?://(www\.)?youtu\.be/",
-        r"https?://(www\.)?svtplay\.se/"
-    ]
-    for pattern in patterns:
-        if re.match(pattern, text):
-            return True
-    return False
+    config.save_settings()
+
+def select_profile():
+    """Select the download profile used for new downloads."""
+    names = profiles.profile_names()
+    choices = [f"{name} (current)" if name == config.PROFILE else name for name in names]
+    choice = gum_choose(choices, header=f"Select download profile (edit {profiles.get_profiles_path()} to add more):")
+
+    if choice is None: return
+
+    config.PROFILE = choice.replace(" (current)", "")
+    config.save_settings()
+    gum_style(f"Download profile: {config.PROFILE}", foreground="212")
+
+def subscribe_link(url):
+    """Follow a playlist, channel or series so 'Sync subscriptions' fetches its new items."""
+    choice = gum_choose(
+        ["Download everything on next sync", "Only new items from now on"],
+        header="Subscribe: what about the items that already exist?"
+    )
+    if choice is None: return
+
+    gum_style("Listing items...", foreground="240")
+    sub, error = run_sync(subscriptions.subscribe(url, skip_existing=choice.startswith("Only")))
+    if error:
+        gum_style(f"❌ Could not subscribe: {error}", foreground="196")
+        return
+    gum_style(f"✔ Subscribed to {sub.title}. New items go to {sub.output_dir}", foreground="212")
+
+def sync_subscriptions():
+    """Download new items of all subscriptions."""
+    subs = subscriptions.load_subscriptions()
+    if not subs:
+        gum_style("No subscriptions yet. Subscribe from a playlist or series menu.", foreground="240")
+        return
+
+    gum_style(f"Syncing {len(subs)} subscriptions...", foreground="212")
+
+    def on_item(sub, entry, result):
+        if result.ok:
+            gum_style(f"✔ {sub.title}: {entry.get('title') or entry['id']}", foreground="212")
+        else:
+            gum_style(f"❌ {sub.title}: {entry.get('title') or entry['id']}: {result.error}", foreground="196")
+
+    def on_result(sub, result):
+        if result.error and not result.downloads:
+            gum_style(f"❌ {sub.title}: {result.error}", foreground="196")
+        elif not result.new:
+            gum_style(f"{sub.title}: nothing new", foreground="240")
+
+    background = priority.background()
+    with metrics.exporting():
+        run_sync(subscriptions.sync_all(subs, on_result=on_result, on_item=on_item, background=background))
+    gum_style("Sync complete!", foreground="212")
+    gum_style(f"Ran at {background.describe()}", foreground="240")
+
+def ask_sections(info):
+    """Ask which time ranges/chapters of a video to keep. Returns (spec, cut) or None."""
+    chapters = info.get("chapters") or []
+    duration = info.get("duration")
+    if duration:
+        gum_style(f"Length: {clips.format_time(duration)}", foreground="240")
+    for c in chapters:
+        gum_style(f"  {clips.format_time(c.get('start_time'))}-{clips.format_time(c.get('end_time'))}  "
+                  f"{c.get('title')}", foreground="240")
+
+    example = "10:00-12:30, 1:02:00-" + (", chapter name" if chapters else "")
+    while True:
+        spec = gum_input(f"Sections to keep (e.g. {example}):")
+        if not spec: return None
+        try:
+            clips.resolve(clips.parse_spec(spec), chapters, duration)
+            break
+        except ValueError as e:
+            gum_style(str(e), foreground="196")
+
+    cut = gum_choose(
+        ["Fast cut (at keyframes, no re-encoding)", "Accurate cut (re-encodes at the cut points)"],
+        header="How should the sections be cut?"
+    )
+    if cut is None: return None
+    return spec, "accurate" if cut.startswith("Accurate") else "fast"
 
 def handle_svtplay(url):
     # SVT Play logic doesn't fetch title upfront to keep it fast, so we use URL as title
@@ -57,7 +148,8 @@ def handle_svtplay(url):
         "Download Specific Episodes (yt-dlp)",
         "Download the LAST X episodes (svtplay-dl)",
         "Stream (MPV)",
-        "Download audio only"
+        "Download audio only",
+        "Subscribe to series (sync new episodes)"
     ]
     
     action = gum_choose(choices, header=header_text)
@@ -69,24 +161,18 @@ def handle_svtplay(url):
 
     if action == "Download (Best quality + Subtitles)":
         gum_style("Starting download from SVT Play...")
-        res = subprocess.run(["svtplay-dl", "-S", "-M", url])
-        success = (res.returncode == 0)
+        success = run_download(url).ok
 
     elif action == "Download Whole Series (-A)":
         gum_style("Starting download of entire series...")
-        res = subprocess.run(["svtplay-dl", "-S", "-M", "-A", url])
-        success = (res.returncode == 0)
+        success = run_download(url, extra_args=["-A"]).ok
 
     elif action == "Download Whole Series (yt-dlp)":
         gum_style("Starting download of entire series with yt-dlp...")
-        cmd = get_ytdlp_base_cmd()
-        cmd.extend([
-            "--embed-subs", "--write-subs", "--sub-langs", "all",
-            "-o", "%(series)s/S%(season_number)02dE%(episode_number)02d - %(title)s.%(ext)s",
-            url
-        ])
-        res = subprocess.run(cmd)
-        success = (res.returncode == 0)
+        success = run_download(
+            url, tool="yt-dlp", mode=None,
+            output_template="%(series)s/S%(season_number)02dE%(episode_number)02d - %(title)s.%(ext)s"
+        ).ok
 
     elif action == "Download Specific Episodes (yt-dlp)":
         items = gum_input("Enter episodes (e.g. 1, 2-5, 10)...")
@@ -94,15 +180,11 @@ def handle_svtplay(url):
 
         if items:
             gum_style(f"Downloading episodes {items} with yt-dlp...")
-            cmd = get_ytdlp_base_cmd()
-            cmd.extend([
-                "--embed-subs", "--write-subs", "--sub-langs", "all",
-                "--playlist-items", items,
-                "-o", "%(series)s/S%(season_number)02dE%(episode_number)02d - %(title)s.%(ext)s",
-                url
-            ])
-            res = subprocess.run(cmd)
-            success = (res.returncode == 0)
+            success = run_download(
+                url, tool="yt-dlp", mode=None,
+                output_template="%(series)s/S%(season_number)02dE%(episode_number)02d - %(title)s.%(ext)s",
+                extra_args=["--playlist-items", items]
+            ).ok
         else:
             return
 
@@ -112,20 +194,22 @@ def handle_svtplay(url):
 
         if count.isdigit():
             gum_style(f"Downloading the last {count} episodes...")
-            res = subprocess.run(["svtplay-dl", "-S", "-M", "-A", "--all-last", count, url])
-            success = (res.returncode == 0)
+            success = run_download(url, extra_args=["-A", "--all-last", count]).ok
         else:
             gum_style("Invalid number specified.", foreground="196")
             return
 
     elif action == "Stream (MPV)":
-        subprocess.run(["mpv", "--no-terminal", url])
+        run_stream(url)
         return "stream"
 
     elif action == "Download audio only":
         gum_style("Downloading audio only...")
-        res = subprocess.run(["svtplay-dl", "--only-audio", url])
-        success = (res.returncode == 0)
+        success = run_download(url, mode="audio").ok
+
+    elif action == "Subscribe to series (sync new episodes)":
+        subscribe_link(url)
+        return "subscribe"
 
     # Result message
     print("\n")
@@ -137,35 +221,38 @@ def handle_svtplay(url):
     return "download"
 
 def handle_youtube(url):
-    # Get info as JSON
-    info_cmd = ["yt-dlp", "--flat-playlist", "--dump-json", "--no-warnings"]
-    if config.COOKIE_BROWSER: info_cmd.extend(["--cookies-from-browser", config.COOKIE_BROWSER])
-    info_cmd.append(url)
-    
-    res = run_command(info_cmd)
+    formats = None
+    route = router.route(url)
+    if route and route.kind == "video":
+        # One compact probe for the title, chapters and quality table
+        info, formats, res = run_sync(api.probe_video(url))
+        entries = [info] if info else None
+    else:
+        # Playlists and channels: flat listing of the entries
+        entries, res = run_sync(api.fetch_info(url))
     
     if not res or res.returncode != 0:
         gum_style("Could not retrieve information for the URL.", foreground="212")
         if res:
             print(f"\n--- DEBUG INFO ---")
-            print(f"Command: {' '.join(info_cmd)}")
+            print(f"Command: {' '.join(res.cmd)}")
             print(f"Return code: {res.returncode}")
-            print(f"Error output:\n{res.stderr}")
+            print(f"Error output:\n" + "\n".join(res.stderr))
             print(f"------------------\n")
         
         if not config.COOKIE_BROWSER:
             gum_style("Tip: Try selecting a browser for cookies in the main menu.", foreground="240")
         return
 
-    try:
-        first_line = res.stdout.strip().split('\n')[0]
-        info = json.loads(first_line)
-    except json.JSONDecodeError:
+    if not entries:
         gum_style("Could not parse video information.", foreground="212")
         return
 
+    info = entries[0]
     title = info.get("title", "Unknown title")
-    is_playlist = info.get("_type") == "playlist" or "list=" in url
+    # Channels are lists too (and can be subscribed to)
+    is_playlist = (info.get("_type") == "playlist" or "list=" in url
+                   or bool(route and route.kind in ("playlist", "channel")))
     
     # Save to history
     add_to_history(title, url)
@@ -178,153 +265,88 @@ def handle_youtube(url):
             "Stream Full Playlist (Video)", 
             "Stream Full Playlist (Audio)",
             "Download Full Playlist (Video)", 
-            "Download Full Playlist (Audio)"
+            "Download Full Playlist (Audio)",
+            "Subscribe (download new items on sync)"
         ]
         action = gum_choose(choices, header=header)
         
         if action is None: return
 
         if action == "Stream Full Playlist (Video)":
-            subprocess.run(["mpv", "--no-terminal", url])
+            run_stream(url)
             return "stream"
         elif action == "Stream Full Playlist (Audio)":
-            subprocess.run(["mpv", "--no-video", url])
+            run_stream(url, audio_only=True)
             return "stream"
+        elif action == "Subscribe (download new items on sync)":
+            subscribe_link(url)
+            return "subscribe"
         
         # For download
         print("\n")
-        cmd = get_ytdlp_base_cmd()
+        mode = "video"
         
         if action == "Download Full Playlist (Video)":
             gum_style("Starting download of full playlist (video)...")
-            cmd.extend([
-                "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-                "--merge-output-format", "mp4",
-                "-o", "%(playlist)s/%(playlist_index)02d - %(title)s.%(ext)s",
-                url
-            ])
         elif action == "Download Full Playlist (Audio)":
             gum_style("Starting download of full playlist (audio)...")
-            cmd.extend([
-                "-f", "bestaudio/best", "-x", "--audio-format", "opus",
-                "-o", "%(playlist)s/%(playlist_index)02d - %(title)s.%(ext)s",
-                url
-            ])
+            mode = "audio"
         
-        subprocess.run(cmd)
+        run_download(url, mode=mode, output_template="%(playlist)s/%(playlist_index)02d - %(title)s.%(ext)s")
         gum_style("✔ Playlist download complete.", foreground="212")
         return "download"
 
     else:
         # Single video
         header = f"What do you want to do with:\n{formatted_title}?"
-        choices = ["Stream Video (MPV)", "Stream Audio (MPV)", "Download video", "Download audio"]
+        choices = ["Stream Video (MPV)", "Stream Audio (MPV)", "Watch and keep (stream + save video)",
+                   "Download video", "Download audio", "Download part (time range / chapters)"]
         action = gum_choose(choices, header=header)
         
         if action is None: return
 
         if action == "Stream Video (MPV)":
-            subprocess.run(["mpv", "--no-terminal", url])
+            run_stream(url)
             return "stream"
         elif action == "Stream Audio (MPV)":
-            subprocess.run(["mpv", "--no-video", url])
+            run_stream(url, audio_only=True)
             return "stream"
+        elif action == "Watch and keep (stream + save video)":
+            print("\n")
+            gum_style("Downloading once for playback and the saved file (closing mpv keeps downloading)...")
+            run_watch_and_keep(url)
+            return "download"
 
         elif action == "Download audio":
             print("\n")
             gum_style("Starting audio download...")
-            cmd = get_ytdlp_base_cmd()
-            cmd.extend([
-                "-f", "bestaudio/best", "-x", "--audio-format", "opus",
-                "-o", "%(title)s.%(ext)s", url
-            ])
-            subprocess.run(cmd)
+            run_download(url, mode="audio")
             gum_style("✔ Download complete.", foreground="212")
             return "download"
 
+        elif action == "Download part (time range / chapters)":
+            answer = ask_sections(info)
+            if answer is None: return
+            spec, cut = answer
+            print("\n")
+            gum_style(f"Downloading {spec}...")
+            result = run_download(url, sections=spec, cut=cut)
+            if result.ok:
+                gum_style(f"✔ Saved {len(result.files)} section(s).", foreground="212")
+            else:
+                gum_style(f"❌ Download failed: {result.error}", foreground="196")
+            return "download"
+
         elif action == "Download video":
-            fmt_cmd = ["yt-dlp", "-J"]
-            if config.COOKIE_BROWSER: fmt_cmd.extend(["--cookies-from-browser", config.COOKIE_BROWSER])
-            fmt_cmd.append(url)
-            
-            res_fmt = run_command(fmt_cmd)
-            if not res_fmt: return
-            
-            try:
-                video_data = json.loads(res_fmt.stdout)
-                formats = video_data.get("formats", [])
-            except:
+            if formats is None:
+                formats = run_sync(api.probe_formats(url))
+            if formats is None:
+                gum_style("Could not retrieve format list.", foreground="212")
                 return
 
-            table_rows = []
-            has_audio_map = {}
-            
-            # Group formats by height to show only ONE choice per resolution (the best one)
-            unique_resolutions = {} # Key: height (int), Value: format_dict
-
-            for f in formats:
-                if f.get("vcodec") == "none": continue
-                
-                height = f.get("height") or 0
-                width = f.get("width") or 0
-                
-                if height == 0: continue
-
-                current_size = f.get("filesize") or f.get("filesize_approx") or 0
-                current_tbr = f.get("tbr") or f.get("vbr") or 0
-                current_fps = f.get("fps") or 0
-                
-                if height not in unique_resolutions:
-                    unique_resolutions[height] = f
-                else:
-                    existing = unique_resolutions[height]
-                    existing_size = existing.get("filesize") or existing.get("filesize_approx") or 0
-                    existing_tbr = existing.get("tbr") or existing.get("vbr") or 0
-                    existing_fps = existing.get("fps") or 0
-                    
-                    replace = False
-                    
-                    if current_fps > existing_fps:
-                        replace = True
-                    elif current_fps < existing_fps:
-                        replace = False
-                    else:
-                        if current_size > 0 and existing_size > 0:
-                            if current_size > existing_size: replace = True
-                        elif current_tbr > 0 and existing_tbr > 0:
-                            if current_tbr > existing_tbr: replace = True
-                        elif current_size > 0 and existing_size == 0:
-                            replace = True
-                        elif current_tbr > 0 and existing_tbr == 0:
-                             replace = True
-                    
-                    if replace:
-                        unique_resolutions[height] = f
-
-            for height, f in unique_resolutions.items():
-                f_id = f.get("format_id", "N/A")
-                width = f.get("width") or 0
-                res = f"{width}x{height}"
-                fps = f.get("fps") or 0
-                ext = f.get("ext", "N/A")
-                
-                acodec = f.get("acodec", "none")
-                has_audio = acodec != "none"
-                has_audio_map[f_id] = has_audio
-                audio_mark = "YES" if has_audio else "NO "
-
-                filesize = f.get("filesize") or f.get("filesize_approx")
-                size_str = "N/A"
-                if filesize:
-                    size_str = f"{filesize / (1024*1024):.1f}MiB"
-
-                row_str = f"{f_id:<5} | {res:<9} | {fps:<4} | {ext:<4} | 🎵:{audio_mark} | {size_str}"
-                
-                table_rows.append({'str': row_str, 'height': height, 'fps': fps})
-
-            table_rows.sort(key=lambda x: x['height'], reverse=True)
-            
-            choices = [r['str'] for r in table_rows]
+            best = best_per_height(formats)
+            has_audio_map = {f.format_id: f.has_audio for f in best}
+            choices = [format_row(f) for f in best]
 
             header = "Select Quality (ID | Resolution | FPS | Type | Audio | Size)"
             choice = gum_choose(choices, header=header)
@@ -339,21 +361,24 @@ def handle_youtube(url):
             if not has_audio_map.get(format_code, False):
                 final_format += "+bestaudio"
             
-            cmd = ["yt-dlp", "--force-overwrites", "--embed-metadata", "--embed-thumbnail"]
-            if config.COOKIE_BROWSER:
-                cmd.extend(["--cookies-from-browser", config.COOKIE_BROWSER])
-            
-            cmd.extend([
-                "-f", final_format, 
-                "--merge-output-format", "mp4", 
-                "-o", "%(title)s-%(height)sp.%(ext)s",
-                url
-            ])
-            
-            subprocess.run(cmd)
+            run_download(
+                url, format_id=final_format,
+                output_template="%(title)s-%(height)sp.%(ext)s",
+                extra_args=["--force-overwrites"]
+            )
             gum_style("✔ Download complete (or finished).", foreground="212")
             return "download"
 
+def show_update_result(result):
+    if result.status == "updated":
+        check = " (checksum verified)" if result.verified else ""
+        gum_style(f"✔ {result.tool} updated to {result.installed_version or 'latest'}{check}.", foreground="212")
+    elif result.status == "up-to-date":
+        version = f" ({result.installed_version})" if result.installed_version else ""
+        gum_style(f"✔ {result.tool} is already up to date{version}.", foreground="212")
+    else:
+        gum_style(f"❌ Failed to update {result.tool}: {result.error}", foreground="196")
+
 def update_tools():
     """Download latest versions of tools."""
     user_bin = config.get_user_bin_dir()
@@ -375,34 +400,16 @@ def update_tools():
     system = platform.system()
     
     # --- YT-DLP ---
-    ytdlp_filename_remote = "yt-dlp"
-    if system == "Windows": ytdlp_filename_remote = "yt-dlp.exe"
-    elif system == "Darwin": ytdlp_filename_remote = "yt-dlp_macos"
-    
-    ytdlp_url = f"https://github.com/yt-dlp/yt-dlp/releases/latest/download/{ytdlp_filename_remote}"
-    ytdlp_local = "yt-dlp.exe" if system == "Windows" else "yt-dlp"
-    
-    gum_style("Downloading latest yt-dlp...", foreground="212")
-    try:
-        urllib.request.urlretrieve(ytdlp_url, os.path.join(user_bin, ytdlp_local))
-        if system != "Windows":
-            os.chmod(os.path.join(user_bin, ytdlp_local), 0o755)
-        gum_style("✔ yt-dlp updated.", foreground="212")
-    except Exception as e:
-        gum_style(f"❌ Failed to update yt-dlp: {e}", foreground="196")
+    gum_style("Checking for a new yt-dlp release...", foreground="212")
+    result = updater.update_ytdlp(user_bin, progress=gum_progress)
+    show_update_result(result)
 
     # --- SVTPLAY-DL ---
     if system == "Windows":
-        svt_remote = "svtplay-dl.exe"
-        # Official site often redirects to latest
-        svt_url = "https://svtplay-dl.se/download/svtplay-dl.exe" 
-        
-        gum_style("Downloading latest svtplay-dl (Windows)...", foreground="212")
-        try:
-            urllib.request.urlretrieve(svt_url, os.path.join(user_bin, svt_remote))
-            gum_style("✔ svtplay-dl updated.", foreground="212")
-        except Exception as e:
-            gum_style(f"❌ Failed to update svtplay-dl: {e}", foreground="196")
+        gum_style("Checking for a new svtplay-dl (Windows)...", foreground="212")
+        result = updater.update_svtplay_windows(user_bin, progress=gum_progress)
+        show_update_result(result)
+        if not result.ok:
             gum_style("Try running: pip install --upgrade svtplay-dl", foreground="240")
     else:
          gum_style("ℹ️  To update svtplay-dl on Linux/macOS, please run:", foreground="240")
@@ -416,46 +423,3 @@ def update_tools():
     # and gum_input logic is specifically for text entry.
     # But for consistency, let's use gum_input but ignore result.
     gum_input("Press Enter to continue...")
-
-# --- Batch Download Functions ---
-
-def download_youtube_silent(url, output_dir, mode="video"):
-    """Download from YouTube without user interaction."""
-    cmd = get_ytdlp_base_cmd()
-    
-    # Set output directory and template
-    # Use -P for path to ensure it goes into the right folder
-    cmd.extend(["-P", str(output_dir)])
-    
-    if mode == "video":
-        cmd.extend([
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "--merge-output-format", "mp4",
-            "-o", "%(title)s.%(ext)s"
-        ])
-    else: # audio
-        cmd.extend([
-            "-f", "bestaudio/best", "-x", "--audio-format", "opus",
-            "-o", "%(title)s.%(ext)s"
-        ])
-        
-    cmd.append(url)
-    
-    return subprocess.run(cmd)
-
-def download_svtplay_silent(url, output_dir, mode="video"):
-    """Download from SVT Play without user interaction."""
-    # svtplay-dl doesn't support -P easily, we might need to chdir or use absolute paths?
-    # svtplay-dl usually downloads to current dir.
-    # We can pass the URL and handle moving, or change cwd temporarily?
-    # Changing CWD is risky in threads, but fine in single process.
-    # Better: svtplay-dl documentation says output filename can be specified, but directory?
-    # Let's use cwd argument in subprocess.run
-    
-    cmd = ["svtplay-dl", "-S", "-M"]
-    if mode == "audio":
-        cmd.append("--only-audio")
-        
-    cmd.append(url)
-    
-    return subprocess.run(cmd, cwd=output_dir)
\ No newline at end of file
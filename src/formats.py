@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+
+# Only the fields the quality table needs. Asking yt-dlp to print just these
+# avoids serializing (and us parsing) the full -J info dict, which is mostly
+# automatic captions, thumbnails and per-format HTTP headers.
+FORMAT_FIELDS = [
+    "format_id", "height", "width", "fps", "ext",
+    "vcodec", "acodec", "filesize", "filesize_approx", "tbr", "vbr",
+]
+
+FORMATS_TEMPLATE = "%(formats.:.{" + ",".join(FORMAT_FIELDS) + "})j"
+
+
+@dataclass(frozen=True)
+class FormatInfo:
+    """The parts of a yt-dlp format entry that QuickTube cares about."""
+    format_id: str
+    height: int = 0
+    width: int = 0
+    fps: float = 0
+    ext: str = "N/A"
+    vcodec: str = "none"
+    acodec: str = "none"
+    filesize: int = 0
+    tbr: float = 0
+
+    @classmethod
+    def from_dict(cls, f):
+        return cls(
+            format_id=str(f.get("format_id", "N/A")),
+            height=f.get("height") or 0,
+            width=f.get("width") or 0,
+            fps=f.get("fps") or 0,
+            ext=f.get("ext") or "N/A",
+            vcodec=f.get("vcodec") or "none",
+            acodec=f.get("acodec") or "none",
+            filesize=f.get("filesize") or f.get("filesize_approx") or 0,
+            tbr=f.get("tbr") or f.get("vbr") or 0,
+        )
+
+    @property
+    def has_video(self):
+        return self.vcodec != "none"
+
+    @property
+    def has_audio(self):
+        return self.acodec != "none"
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}"
+
+    @property
+    def size_str(self):
+        if not self.filesize:
+            return "N/A"
+        return f"{self.filesize / (1024*1024):.1f}MiB"
+
+
+def parse_formats(data):
+    """Turn a list of format dicts into FormatInfo records."""
+    if not isinstance(data, list):
+        return []
+    return [FormatInfo.from_dict(f) for f in data if isinstance(f, dict)]
+
+
+def best_per_height(formats):
+    """
+    Group video formats by height and keep ONE per resolution (the best one).
+    Prefers higher fps, then larger file size, then higher bitrate.
+    Returns the chosen formats sorted by height, highest first.
+    """
+    unique_resolutions = {} # Key: height (int), Value: FormatInfo
+
+    for f in formats:
+        if not f.has_video or f.height == 0: continue
+
+        existing = unique_resolutions.get(f.height)
+        if existing is None:
+            unique_resolutions[f.height] = f
+            continue
+
+        replace = False
+
+        if f.fps > existing.fps:
+            replace = True
+        elif f.fps < existing.fps:
+            replace = False
+        else:
+            if f.filesize > 0 and existing.filesize > 0:
+                if f.filesize > existing.filesize: replace = True
+            elif f.tbr > 0 and existing.tbr > 0:
+                if f.tbr > existing.tbr: replace = True
+            elif f.filesize > 0 and existing.filesize == 0:
+                replace = True
+            elif f.tbr > 0 and existing.tbr == 0:
+                replace = True
+
+        if replace:
+            unique_resolutions[f.height] = f
+
+    return sorted(unique_resolutions.values(), key=lambda f: f.height, reverse=True)
+
+
+def format_row(f):
+    """Render one line of the quality table."""
+    audio_mark = "YES" if f.has_audio else "NO "
+    return f"{f.format_id:<5} | {f.resolution:<9} | {f.fps:<4} | {f.ext:<4} | 🎵:{audio_mark} | {f.size_str}"
@@ -12,17 +12,22 @@ Welcome to the professional way of handling web media. Here is how you master Qu
 ## 1. The Clipboard Flow
 QuickTube is designed for speed. When you start the app, it immediately looks at your system clipboard. 
 - **Tip:** Copy a YouTube or SVT Play link *before* you start the app, and you can just hit **Enter** to process it instantly.
+- **Watch and keep:** Want to watch a video *and* keep it? Pick 'Watch and keep' instead of streaming first and downloading later. It is fetched once, and closing mpv early doesn't stop the download.
 
 ## 2. Batch Downloading
 Need to download 50 videos? Don't do it one by one.
 - **Menu:** Use the 'Batch Download from file' option and select a `.txt` file with one URL per line.
 - **CLI:** Run `quicktube links.txt` directly from your terminal to start a batch job immediately.
+- **Scripts:** `quicktube get URL --mode audio --jobs 4 --out DIR` and `quicktube info URL` run without prompts and print JSON.
+- **Subscriptions:** Choose 'Subscribe' on a playlist or SVT series, then use 'Sync subscriptions' (or `quicktube sync`) to download only the new items.
+- **Clips:** Choose 'Download part' on a video (or `quicktube get URL --sections "10:00-12:30, Intro"`) to fetch only some time ranges or chapters.
 
 ## 3. Bypassing Bot Detection
 If you get "Sign in to confirm you are not a bot" errors:
 - Use the **'Select cookie browser'** option in the main menu.
 - Choose the browser where you are currently logged into YouTube (e.g., Chrome or Firefox).
 - QuickTube will "borrow" your session cookies to authenticate the download.
+- The cookies are exported once to a private file in the config folder and reused (refreshed every few hours or when YouTube rejects them). Your browser choice is remembered between runs.
 
 ## 4. Navigation Shortcuts
 - **q / Esc:** Use these to go back or cancel at any time.
@@ -32,6 +37,7 @@ If you get "Sign in to confirm you are not a bot" errors:
 ## 5. Storage & Logs
 - **Logs:** If something fails, check `log.txt` in the application folder.
 - **History:** QuickTube remembers your last 3 videos. You can access them directly from the Main Menu.
+- **Profiles:** Add your own download profiles (subtitle languages, max resolution, codec, thumbnails) to `profiles.json` in the config folder and pick one with **'Select download profile'**, in batch mode, or with `--profile`.
 
 ---
 *Press Enter to return to the menu*
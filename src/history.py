@@ -1,6 +1,7 @@
 import os
 import json
 from src.config import get_user_config_dir
+from src.router import route, canonical_key
 
 HISTORY_FILE = "history.json"
 MAX_HISTORY = 3
@@ -32,11 +33,16 @@ def add_to_history(title, url):
     """Add a video to history, keeping only the last MAX_HISTORY items."""
     history = load_history()
     
-    # Remove existing entry if url matches (to bump it to top)
-    history = [item for item in history if item.get("url") != url]
+    # Remove existing entry for the same video (to bump it to top), however the link was written
+    key = canonical_key(url)
+    history = [item for item in history if canonical_key(item.get("url", "")) != key]
     
-    # Add new item to the BEGINNING
-    history.insert(0, {"title": title, "url": url})
+    # Add new item to the BEGINNING, stored without tracking parameters
+    r = route(url)
+    canonical = r.url if r and r.kind != "page" else url
+    if not title or title == url: # SVT links are titled with the link itself
+        title = canonical
+    history.insert(0, {"title": title, "url": canonical})
     
     # Trim to max size
     history = history[:MAX_HISTORY]
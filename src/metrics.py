@@ -0,0 +1,328 @@
+"""
+Metrics in the OpenMetrics text format.
+
+api.download, the metadata lookups and the batch/sync/worker loops update
+one process-wide registry: jobs started/succeeded/failed (by site and error
+class), bytes downloaded, extraction and download durations, queue depth
+and active downloads. While a batch, `get`, `sync` or `worker` runs,
+exporting() keeps the numbers available to Prometheus:
+
+*   as a textfile (config.METRICS_FILE, e.g. for node_exporter's textfile
+    collector), rewritten atomically every few seconds and at the end;
+*   over HTTP on 127.0.0.1:config.METRICS_PORT at /metrics.
+
+Without either, the counters are only kept in memory.
+"""
+import os
+import re
+import math
+import time
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.cookies import is_auth_error
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+WRITE_INTERVAL = 15     # seconds between textfile rewrites
+
+# Seconds; extractions take ~1-10s, downloads up to hours
+EXTRACTION_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DOWNLOAD_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f"# TYPE {self.name} {self.type}", f"# HELP {self.name} {_escape(self.help)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}_total{_labels(self.label_names, key)} {_number(value)}" for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DOWNLOAD_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return counts[-1]
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOBS_STARTED = REGISTRY.register(Counter(
+    "quicktube_jobs_started", "Downloads started.", ["site"]))
+JOBS_SUCCEEDED = REGISTRY.register(Counter(
+    "quicktube_jobs_succeeded", "Downloads that finished successfully.", ["site"]))
+JOBS_FAILED = REGISTRY.register(Counter(
+    "quicktube_jobs_failed", "Downloads that failed, by error class.", ["site", "error_class"]))
+BYTES_DOWNLOADED = REGISTRY.register(Counter(
+    "quicktube_downloaded_bytes", "Size of the files saved.", ["site"]))
+EXTRACTION_SECONDS = REGISTRY.register(Histogram(
+    "quicktube_extraction_duration_seconds", "Time spent looking up metadata and playlist entries.",
+    ["site"], EXTRACTION_BUCKETS))
+DOWNLOAD_SECONDS = REGISTRY.register(Histogram(
+    "quicktube_download_duration_seconds", "Wall time of downloads, including post-processing.",
+    ["site", "outcome"], DOWNLOAD_BUCKETS))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "quicktube_queue_depth", "Links waiting for a free download slot.", ["queue"]))
+ACTIVE_DOWNLOADS = REGISTRY.register(Gauge(
+    "quicktube_active_workers", "Downloads running right now."))
+ACTIVE_DOWNLOADS.set(0)
+
+
+# (error class, pattern) checked in order against a DownloadResult's error
+ERROR_CLASSES = [
+    ("rate_limited", re.compile(r"HTTP Error 429|Too Many Requests", re.I)),
+    ("unavailable", re.compile(r"unavailable|private video|removed|not available|does not exist|"
+                               r"HTTP Error 404|HTTP Error 410|geo.?restrict", re.I)),
+    ("http_error", re.compile(r"HTTP Error \d+", re.I)),
+    ("network", re.compile(r"connection|network|name resolution|timed out|unreachable|ssl", re.I)),
+    ("no_space", re.compile(r"not enough (scratch )?space|No space left", re.I)),
+    ("postprocess", re.compile(r"ffmpeg|postprocess|merg", re.I)),
+    ("usage", re.compile(r"unknown (profile|cut|chapter)|chapter|section|partial downloads", re.I)),
+]
+
+def error_class(result):
+    """Short, low-cardinality label for why a download failed."""
+    error = result.error or ""
+    if result.timed_out:
+        return "timeout"
+    if error == "invalid link":
+        return "invalid_link"
+    if error == "command not found":
+        return "missing_tool"
+    if is_auth_error(error):
+        return "auth"
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(error):
+            return name
+    return "other"
+
+
+def site_label(site):
+    """Value of the site label; links no site handler claims count as "unknown"."""
+    return site or "unknown"
+
+def record_download(result):
+    """Count a finished api.download result."""
+    site = site_label(result.site)
+    if result.ok:
+        JOBS_SUCCEEDED.inc(site=site)
+        BYTES_DOWNLOADED.inc(sum(f.size or 0 for f in result.files), site=site)
+    else:
+        JOBS_FAILED.inc(site=site, error_class=error_class(result))
+    if result.elapsed:
+        DOWNLOAD_SECONDS.observe(result.elapsed, site=site, outcome="ok" if result.ok else "failed")
+
+
+def write_textfile(path):
+    """Write the registry to path atomically (the collector may read at any time)."""
+    path = os.path.abspath(path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(REGISTRY.render())
+        os.replace(tmp, path)
+    except OSError:
+        pass # Fail silently, metrics must never break a download
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread. Returns the server (call .shutdown())."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextmanager
+def exporting(path=None, port=None, interval=WRITE_INTERVAL):
+    """
+    Export the registry while the block runs: rewrite the textfile at `path`
+    every `interval` seconds and once more at the end, and serve it on
+    127.0.0.1:`port`. Defaults come from config; without either it does nothing.
+    """
+    import src.config as config
+    path = path or config.METRICS_FILE
+    port = port or config.METRICS_PORT
+
+    server = None
+    if port:
+        try:
+            server = serve(port)
+        except OSError:
+            server = None # Port taken, e.g. by a second worker on this host
+
+    stop = threading.Event()
+    writer = None
+    if path:
+        def loop():
+            while not stop.wait(interval):
+                write_textfile(path)
+        write_textfile(path)
+        writer = threading.Thread(target=loop, daemon=True)
+        writer.start()
+
+    try:
+        yield server
+    finally:
+        stop.set()
+        if writer:
+            writer.join()
+            write_textfile(path)
+        if server:
+            server.shutdown()
+            server.server_close()
+
+
+@asynccontextmanager
+async def slot(semaphore, queue):
+    """Hold an asyncio semaphore, counting the wait in the queue depth gauge."""
+    QUEUE_DEPTH.inc(queue=queue)
+    try:
+        await semaphore.acquire()
+    finally:
+        QUEUE_DEPTH.dec(queue=queue)
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        histogram.observe(time.monotonic() - start, **labels)
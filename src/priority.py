@@ -0,0 +1,157 @@
+"""
+Scheduling priority for background jobs.
+
+Batch downloads, `get`, `sync` and `worker` run their tools in the
+background class: yt-dlp/svtplay-dl get a higher nice value and a lower I/O
+priority (ionice on Linux), which the ffmpeg merges and transcodes they
+start inherit. Jobs whose transfer is itself CPU-bound (accurate cuts,
+which ffmpeg re-encodes while downloading) additionally share a cap
+relative to the core count. Interactive actions (streaming, single
+downloads from the menu) keep normal priority.
+
+Configured in settings.json:
+
+    "background_nice": 10            0 = unchanged
+    "background_ionice": "idle"      "best-effort:0".."best-effort:7", "idle" or "none"
+    "cpu_heavy_jobs": "50%"          accurate cuts at once: share of the cores, or a number
+"""
+import os
+import sys
+import shutil
+import asyncio
+import weakref
+import subprocess
+from dataclasses import dataclass, field
+
+import src.config as config
+
+IONICE_CLASSES = {"best-effort": "2", "idle": "3"}
+
+# Windows has priority classes instead of nice values
+WINDOWS_CLASSES = [(15, "IDLE_PRIORITY_CLASS"), (1, "BELOW_NORMAL_PRIORITY_CLASS")]
+
+
+def parse_cpu_jobs(value, cores):
+    """Number of accurate-cut jobs allowed at once for a "50%" / 3 style setting."""
+    try:
+        if isinstance(value, str) and value.strip().endswith("%"):
+            count = round(cores * float(value.strip()[:-1]) / 100)
+        else:
+            count = int(value)
+    except (TypeError, ValueError):
+        count = cores // 2
+    return max(1, count)
+
+def parse_ionice(value):
+    """(class, level) for an ionice setting, None for "none"/invalid."""
+    name, _, level = str(value or "none").partition(":")
+    if name not in IONICE_CLASSES:
+        return None
+    if name == "idle":
+        return IONICE_CLASSES[name], None
+    try:
+        return IONICE_CLASSES[name], str(min(7, max(0, int(level or 7))))
+    except ValueError:
+        return None
+
+
+@dataclass
+class Policy:
+    nice: int = 0
+    ionice: str = "none"
+    cpu_jobs: int = 1
+    cores: int = 1
+    notes: list = field(default_factory=list)   # limits that can't be applied here
+
+    def spawn_kwargs(self):
+        """Extra create_subprocess_exec arguments (Windows priority class)."""
+        if sys.platform != "win32" or self.nice <= 0:
+            return {}
+        for threshold, name in WINDOWS_CLASSES:
+            if self.nice >= threshold:
+                return {"creationflags": getattr(subprocess, name)}
+        return {}
+
+    async def apply(self, pid):
+        """Lower a freshly started process's CPU and I/O priority."""
+        if self.nice > 0 and hasattr(os, "setpriority"):
+            try:
+                current = os.getpriority(os.PRIO_PROCESS, pid)
+                os.setpriority(os.PRIO_PROCESS, pid, min(19, current + self.nice))
+            except (OSError, ProcessLookupError):
+                pass # Already gone
+        ionice = parse_ionice(self.ionice)
+        if ionice and sys.platform.startswith("linux") and shutil.which("ionice"):
+            cls, level = ionice
+            cmd = ["ionice", "-c", cls, *(["-n", level] if level else []), "-p", str(pid)]
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+                )
+                await proc.wait()
+            except OSError:
+                pass
+
+    def cpu_slots(self):
+        """Semaphore of the cpu_jobs slots, shared by all downloads on this event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = _cpu_slots.get(loop)
+        if semaphore is None:
+            semaphore = _cpu_slots[loop] = asyncio.Semaphore(self.cpu_jobs)
+        return semaphore
+
+    def summary(self):
+        return {
+            "nice": self.nice,
+            "ionice": self.ionice if parse_ionice(self.ionice) else None,
+            "cpu_heavy_jobs": self.cpu_jobs,
+            "cores": self.cores,
+            "notes": list(self.notes),
+        }
+
+    def describe(self):
+        parts = [f"nice +{self.nice}" if self.nice > 0 else "normal CPU priority"]
+        if parse_ionice(self.ionice):
+            parts.append(f"ionice {self.ionice}")
+        parts.append(f"at most {self.cpu_jobs} accurate-cut re-encode{'s' if self.cpu_jobs != 1 else ''} "
+                     f"at once ({self.cores} core{'s' if self.cores != 1 else ''})")
+        text = ", ".join(parts)
+        return text + (f" ({'; '.join(self.notes)})" if self.notes else "")
+
+
+# One semaphore per event loop (run_sync starts a new loop per batch)
+_cpu_slots = weakref.WeakKeyDictionary()
+
+def parse_nice(value):
+    try:
+        return max(0, min(19, int(value or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+def background(nice=None, ionice=None, cpu_jobs=None):
+    """The background Policy from the settings; arguments override them."""
+    cores = os.cpu_count() or 1
+    policy = Policy(
+        nice=parse_nice(config.BACKGROUND_NICE if nice is None else nice),
+        ionice=str((config.BACKGROUND_IONICE if ionice is None else ionice) or "none"),
+        cpu_jobs=parse_cpu_jobs(config.CPU_HEAVY_JOBS if cpu_jobs is None else cpu_jobs, cores),
+        cores=cores,
+    )
+    if parse_ionice(policy.ionice):
+        if not sys.platform.startswith("linux"):
+            policy.notes.append("ionice is Linux-only")
+        elif not shutil.which("ionice"):
+            policy.notes.append("ionice not installed")
+    if policy.nice and sys.platform != "win32" and not hasattr(os, "setpriority"):
+        policy.notes.append("nice not supported")
+    return policy
+
+def is_cpu_heavy(mode, sections=None, cut=None):
+    """
+    Accurate cuts are re-encoded for the whole download, so they take a CPU
+    slot. The opus transcode of audio downloads only runs briefly after the
+    transfer, in the same yt-dlp process: a slot would be held through the
+    network transfer too and throttle batches, so nice/ionice alone keep it
+    out of the way.
+    """
+    return bool(sections and cut == "accurate")
@@ -0,0 +1,165 @@
+"""
+Download profiles.
+
+A profile decides which optional extras a download fetches: subtitle
+languages, max resolution, preferred video codec, embedded thumbnail and
+metadata, and how many fragments yt-dlp downloads in parallel. Profiles live
+in profiles.json in the config directory; every setting can be overridden per
+site ("youtube", "svtplay") and per site and mode ("svtplay:audio"):
+
+    {
+      "lean": {
+        "subtitles": ["sv"],
+        "max_height": 720,
+        "codec": "avc1",
+        "embed_thumbnail": false,
+        "fragments": 4,
+        "sites": {"youtube": {"subtitles": []}}
+      }
+    }
+
+The built-in "default" profile reproduces QuickTube's classic behaviour and
+can be overridden the same way.
+"""
+import os
+import json
+from dataclasses import dataclass, field, fields
+
+import src.config as config
+
+PROFILES_FILE = "profiles.json"
+DEFAULT_PROFILE = "default"
+
+BUILTIN_PROFILES = {
+    DEFAULT_PROFILE: {
+        "embed_thumbnail": True,
+        "embed_metadata": True,
+        "sites": {
+            "svtplay": {"subtitles": ["all"]},
+            "svtplay:audio": {"subtitles": []},
+        },
+    },
+}
+
+
+@dataclass
+class Profile:
+    """Settings of one profile, resolved for a site and mode."""
+    name: str = DEFAULT_PROFILE
+    subtitles: list = field(default_factory=list)  # language codes, ["all"], or [] for none
+    max_height: int = None                          # cap used when no quality is chosen
+    codec: str = None                               # preferred video codec, e.g. "avc1", "vp9", "av01"
+    embed_thumbnail: bool = True
+    embed_metadata: bool = True
+    fragments: int = None                           # concurrent fragment downloads (yt-dlp -N)
+
+    def ytdlp_args(self, mode="video"):
+        args = []
+        if self.embed_metadata:
+            args.append("--embed-metadata")
+        if self.embed_thumbnail:
+            args.append("--embed-thumbnail")
+        if mode != "audio":
+            if self.subtitles:
+                args.extend(["--embed-subs", "--write-subs", "--sub-langs", ",".join(self.subtitles)])
+            sort = []
+            # In video mode the height cap goes into the -f selector instead
+            if mode is None and self.max_height:
+                sort.append(f"res:{self.max_height}")
+            if self.codec:
+                sort.append(f"vcodec:{self.codec}")
+            if sort:
+                args.extend(["-S", ",".join(sort)])
+        if self.fragments and self.fragments > 1:
+            args.extend(["-N", str(self.fragments)])
+        return args
+
+    def svtplay_args(self, mode="video"):
+        # svtplay-dl can only fetch the default subtitle (or all of them),
+        # so any language list just means "with subtitles"
+        args = []
+        if mode == "audio":
+            args.append("--only-audio")
+        elif self.subtitles:
+            args.extend(["-S", "-M"])
+        return args
+
+
+def get_profiles_path():
+    return os.path.join(config.get_user_config_dir(), PROFILES_FILE)
+
+def load_profiles():
+    """Built-in profiles merged with the user's profiles.json."""
+    profiles = {name: dict(data) for name, data in BUILTIN_PROFILES.items()}
+    try:
+        with open(get_profiles_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return profiles
+    if isinstance(data, dict):
+        for name, settings in data.items():
+            if isinstance(settings, dict):
+                profiles[name] = settings
+    return profiles
+
+def profile_names():
+    return list(load_profiles())
+
+def resolve(name=None, site="youtube", mode="video"):
+    """
+    Settings of profile `name` (default config.PROFILE) for a site and mode.
+    Raises ValueError for unknown profiles and settings of the wrong type.
+    """
+    name = name or config.PROFILE or DEFAULT_PROFILE
+    profiles = load_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown profile: {name}")
+
+    data = profiles[name]
+    sites = data.get("sites") or {}
+    overrides = [site, f"{site}:{mode}"] if mode else [site]
+    if not isinstance(sites, dict) or not all(isinstance(sites.get(k) or {}, dict) for k in overrides):
+        raise ValueError(f"Profile {name}: sites must map site names to settings")
+    merged = {k: v for k, v in data.items() if k != "sites"}
+    for key in overrides:
+        merged.update(sites.get(key) or {})
+
+    known = {f.name for f in fields(Profile)}
+    values = {k: _check(name, k, v) for k, v in merged.items() if k in known and k != "name"}
+    return Profile(name=name, **values)
+
+def _check(profile, key, value):
+    """A profiles.json value in the type Profile expects. Raises ValueError for bad values."""
+    def bad(expected):
+        return ValueError(f"Profile {profile}: {key} must be {expected}, got {value!r}")
+
+    if key in ("max_height", "fragments"):
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            raise bad("a positive whole number")
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise bad("a positive whole number") from None
+        # "4" and 4.0 are fine, 4.5 and "4.5" are not
+        if (number != value and str(number) != str(value).strip()) or number < 1:
+            raise bad("a positive whole number")
+        return number
+    if key in ("embed_thumbnail", "embed_metadata"):
+        if not isinstance(value, bool):
+            raise bad("true or false")
+        return value
+    if key == "codec":
+        if value is not None and not isinstance(value, str):
+            raise bad("a codec name")
+        return value or None
+    if key == "subtitles":
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not all(isinstance(lang, str) for lang in value):
+            raise bad("a list of language codes")
+        return list(value)
+    return value
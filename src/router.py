@@ -0,0 +1,175 @@
+"""
+URL router.
+
+Site handlers are kept in a registry whose host patterns are compiled into a
+single regex, so a link is classified with one match. The handler then turns
+it into a Route: site, kind (video/playlist/channel/series/page), id and a
+canonical URL without tracking parameters. Route.key ("youtube:video:<id>")
+is what history, batch de-duplication and subscriptions compare, so
+youtu.be/X, youtube.com/watch?v=X&t=30&si=... and music.youtube.com/watch?v=X
+are all the same video.
+
+Register another site with register(handler); handler.hosts must only use
+non-capturing groups.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a link came from
+TRACKING_PARAMS = {"si", "feature", "pp", "t", "start", "ab_channel", "fbclid", "gclid", "igshid", "ref", "app"}
+
+
+@dataclass(frozen=True)
+class Route:
+    site: str
+    kind: str         # video, playlist, channel, series or page
+    id: str
+    url: str          # canonical URL
+
+    @property
+    def key(self):
+        return f"{self.site}:{self.kind}:{self.id}"
+
+
+def clean_query(query, keep=None):
+    """Drop tracking parameters (or keep only `keep`), sorted for stable keys."""
+    params = [
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+        if (k in keep if keep is not None else k not in TRACKING_PARAMS and not k.startswith("utm_"))
+    ]
+    return urlencode(sorted(params))
+
+
+class SiteHandler:
+    name = None
+    hosts = None    # regex for the host, non-capturing groups only
+    base = None     # scheme + host of canonical URLs
+
+    def route(self, host, path, query):
+        raise NotImplementedError
+
+    def page(self, path, query):
+        path = path.rstrip("/") or "/"
+        query = clean_query(query)
+        return Route(self.name, "page", path + (f"?{query}" if query else ""),
+                     self.base + path + (f"?{query}" if query else ""))
+
+
+class YouTube(SiteHandler):
+    name = "youtube"
+    hosts = r"(?:(?:www|m|music)\.)?youtube\.com|youtu\.be|(?:www\.)?youtube-nocookie\.com"
+    base = "https://www.youtube.com"
+
+    VIDEO_ID = re.compile(r"[\w-]{11}")
+    VIDEO_PATH = re.compile(r"/(?:shorts|live|embed|v|e)/([\w-]{11})(?:[/?#]|$)")
+    CHANNEL_PATH = re.compile(
+        r"/(@[^/]+|channel/[\w-]+|c/[^/]+|user/[^/]+)(?:/(videos|streams|shorts|playlists|featured|live))?/?$"
+    )
+
+    def video(self, video_id):
+        return Route(self.name, "video", video_id, f"{self.base}/watch?v={video_id}")
+
+    def playlist(self, list_id):
+        return Route(self.name, "playlist", list_id, f"{self.base}/playlist?list={list_id}")
+
+    def route(self, host, path, query):
+        params = dict(parse_qsl(query))
+        # "list=" makes QuickTube (and yt-dlp) treat a link as the playlist
+        if params.get("list") and (path in ("/watch", "/playlist") or host == "youtu.be"):
+            return self.playlist(params["list"])
+
+        if host == "youtu.be":
+            video_id = path.strip("/").split("/")[0]
+            return self.video(video_id) if self.VIDEO_ID.fullmatch(video_id) else self.page(path, query)
+        if path == "/watch" and self.VIDEO_ID.fullmatch(params.get("v", "")):
+            return self.video(params["v"])
+
+        match = self.VIDEO_PATH.match(path)
+        if match:
+            return self.video(match.group(1))
+
+        match = self.CHANNEL_PATH.match(path)
+        if match:
+            channel = match.group(1) + (f"/{match.group(2)}" if match.group(2) else "")
+            return Route(self.name, "channel", channel, f"{self.base}/{channel}")
+
+        return self.page(path, query)
+
+
+class SVTPlay(SiteHandler):
+    name = "svtplay"
+    hosts = r"(?:www\.)?svtplay\.se"
+    base = "https://www.svtplay.se"
+
+    VIDEO_PATH = re.compile(r"/(?:video|klipp)/([\w-]+)")
+    SERIES_PATH = re.compile(r"/([\w-]+)/?$")
+
+    def route(self, host, path, query):
+        match = self.VIDEO_PATH.match(path)
+        if match:
+            return Route(self.name, "video", match.group(1), f"{self.base}/video/{match.group(1)}")
+
+        # Episodes opened from a series page: /<series>?id=<episode>
+        params = dict(parse_qsl(query))
+        episode = params.get("id") or params.get("modalId")
+        if episode:
+            keep = "id" if params.get("id") else "modalId"
+            return Route(self.name, "video", episode, f"{self.base}{path}?{clean_query(query, {keep})}")
+
+        match = self.SERIES_PATH.match(path)
+        if match:
+            return Route(self.name, "series", match.group(1), f"{self.base}/{match.group(1)}")
+
+        return self.page(path, query)
+
+
+_handlers = {}
+_pattern = None
+
+def register(handler):
+    """Add (or replace) a site handler and recompile the host pattern."""
+    global _pattern
+    _handlers[handler.name] = handler
+    alternatives = "|".join(f"(?P<{name}>{h.hosts})" for name, h in _handlers.items())
+    _pattern = re.compile(rf"https?://(?:{alternatives})(?=[/?#:]|$)", re.IGNORECASE)
+    route.cache_clear()
+
+@lru_cache(maxsize=8192)
+def route(url):
+    """Route for a link, or None if no handler claims it."""
+    url = url.strip()
+    match = _pattern.match(url)
+    if not match:
+        return None
+    handler = _handlers[match.lastgroup]
+    parts = urlsplit(url)
+    return handler.route((parts.hostname or "").lower(), parts.path or "/", parts.query)
+
+def site_for(url):
+    """Site name of a link, or None if no handler claims it."""
+    r = route(url)
+    return r.site if r else None
+
+def canonical_key(url):
+    """Key that is equal for equivalent links; unknown links key on themselves."""
+    r = route(url)
+    return r.key if r else url.strip()
+
+def dedupe(urls):
+    """Drop links that are equivalent to an earlier one. Returns (unique, duplicates)."""
+    seen = set()
+    unique, duplicates = [], []
+    for url in urls:
+        key = canonical_key(url)
+        if key in seen:
+            duplicates.append(url)
+        else:
+            seen.add(key)
+            unique.append(url)
+    return unique, duplicates
+
+
+register(YouTube())
+register(SVTPlay())
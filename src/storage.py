@@ -0,0 +1,133 @@
+import os
+import errno
+import shutil
+import asyncio
+from pathlib import Path
+
+# Always leave this much free on scratch and destination
+SPACE_MARGIN = 512 * 1024 * 1024
+
+# Leftovers of unfinished downloads that must not reach the destination
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".temp", ".tmp")
+
+# Scratch needs room for the separate video/audio streams plus the merged file
+SCRATCH_FACTOR = 2
+
+def free_space(path):
+    """Free bytes on the filesystem holding path (or its nearest existing parent)."""
+    path = Path(path).resolve()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+def same_filesystem(a, b):
+    try:
+        return os.stat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
+
+def numbered(dest, n):
+    """dest with a " (n)" suffix before the extension."""
+    return dest if n == 1 else dest.with_name(f"{dest.stem} ({n}){dest.suffix}")
+
+def publish_new(src, dest):
+    """
+    Give src (on dest's filesystem) a name next to dest that nobody else has
+    taken, without ever replacing an existing file: a hard link is created
+    atomically or fails, so concurrent writers (even on other hosts sharing
+    the folder) can't clobber each other. Returns the final path.
+    """
+    n = 1
+    while True:
+        candidate = numbered(dest, n)
+        try:
+            os.link(src, candidate)
+        except FileExistsError:
+            n += 1
+            continue
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV):
+                raise
+            # No hard links here (e.g. FAT/exFAT), best effort
+            if candidate.exists():
+                n += 1
+                continue
+            os.replace(src, candidate)
+            return candidate
+        os.unlink(src)
+        return candidate
+
+def atomic_move(src, dest, overwrite=True):
+    """
+    Move src to dest so that dest only ever appears complete.
+    Across filesystems the file is copied to a hidden temp name next to dest
+    and renamed into place, so readers of the destination (e.g. a NAS share)
+    never see a half-written file.
+    With overwrite=False an existing dest is kept and the file gets a
+    numbered name instead. Returns the final path.
+    """
+    src, dest = Path(src), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    if same_filesystem(src.parent, dest.parent):
+        if not overwrite:
+            return publish_new(src, dest)
+        os.replace(src, dest)
+        return dest
+
+    tmp = dest.parent / f".{dest.name}.{os.getpid()}.quicktube-tmp"
+    try:
+        shutil.copyfile(src, tmp)
+        shutil.copystat(src, tmp)
+        if overwrite:
+            os.replace(tmp, dest)
+        else:
+            dest = publish_new(tmp, dest)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+    src.unlink()
+    return dest
+
+def finalize(staging, output_dir, overwrite=True):
+    """
+    Move every file from a staging folder into output_dir, keeping subfolders.
+    Returns a dict mapping staged path -> final path.
+    """
+    staging, output_dir = Path(staging), Path(output_dir)
+    moved = {}
+    for p in sorted(p for p in staging.rglob("*") if p.is_file()):
+        if p.name.endswith(PARTIAL_SUFFIXES) or ".part-Frag" in p.name:
+            continue
+        target = output_dir / p.relative_to(staging)
+        moved[str(p.resolve())] = str(atomic_move(p, target, overwrite).resolve())
+    return moved
+
+class SpaceBudget:
+    """
+    Reserve scratch space for running jobs. acquire() waits until the bytes
+    fit next to what is already reserved, so jobs are throttled instead of
+    filling the disk. A job that can never fit raises OSError.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.reserved = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, size):
+        if size > self.capacity:
+            raise OSError(f"needs {size} bytes of scratch space, only {self.capacity} available")
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.reserved + size <= self.capacity)
+            self.reserved += size
+
+    async def release(self, size):
+        async with self.condition:
+            self.reserved -= size
+            self.condition.notify_all()
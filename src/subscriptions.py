@@ -0,0 +1,256 @@
+"""
+Subscriptions: playlists, channels and series that are synced incrementally.
+
+Each subscription remembers the ids of the items it has downloaded. A sync
+lists the source newest-first and stops after KNOWN_STREAK known ids in a
+row, so a weekly sync only pages through what is new. Items whose download
+failed are kept as pending and retried on every sync (the early stop would
+never list them again), until they failed RETRY_LIMIT times. Sources that aren't
+newest-first (regular YouTube playlists, SVT series) are listed completely,
+but still only new items are downloaded.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+from datetime import datetime
+from dataclasses import dataclass, field, fields, asdict, replace
+
+import src.config as config
+from src import api
+from src import router
+from src import metrics
+
+SUBSCRIPTIONS_FILE = "subscriptions.json"
+
+# Known ids in a row that mark the end of what's new
+KNOWN_STREAK = 3
+
+# Syncs in a row a pending item may fail before it is given up
+RETRY_LIMIT = 5
+
+# Channel tabs that list uploads newest-first
+NEWEST_FIRST_TABS = ("videos", "streams", "shorts")
+
+
+@dataclass
+class Subscription:
+    url: str
+    title: str = None
+    output_dir: str = None
+    mode: str = "video"
+    profile: str = None
+    newest_first: bool = True
+    known: list = field(default_factory=list)
+    pending: list = field(default_factory=list)   # {"id", "url", "title", "attempts"} of failed items
+    last_sync: str = None
+
+
+@dataclass
+class SyncResult:
+    url: str
+    title: str = None
+    ok: bool = False
+    listed: int = 0                                  # entries enumerated
+    stopped_early: bool = False                      # listing ended at known items
+    new: list = field(default_factory=list)          # ids not seen before
+    retried: list = field(default_factory=list)      # pending ids from earlier syncs
+    given_up: list = field(default_factory=list)     # pending ids dropped after RETRY_LIMIT failures
+    downloads: list = field(default_factory=list)    # api.DownloadResult per new item
+    error: str = None
+    elapsed: float = 0.0
+
+
+def get_subscriptions_path():
+    return os.path.join(config.get_user_config_dir(), SUBSCRIPTIONS_FILE)
+
+def load_subscriptions():
+    try:
+        with open(get_subscriptions_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return []
+    if not isinstance(data, list):
+        return []
+    names = {f.name for f in fields(Subscription)}
+    return [
+        Subscription(**{k: v for k, v in item.items() if k in names})
+        for item in data if isinstance(item, dict) and item.get("url")
+    ]
+
+def save_subscriptions(subs):
+    """Write the subscriptions atomically, an interrupted sync must not lose them."""
+    path = get_subscriptions_path()
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(sub) for sub in subs], f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass # Fail silently
+
+def channel_tab(route):
+    """Tab of a YouTube channel route ("videos", ...), None without one."""
+    match = router.YouTube.CHANNEL_PATH.match("/" + route.id)
+    return match.group(2) if match else None
+
+def source_url(url):
+    """
+    The link a subscription lists. A YouTube channel without a tab (or its
+    "featured" tab) lists the channel's tabs instead of its uploads, so
+    those subscribe to the Videos tab.
+    """
+    r = router.route(url)
+    if r and r.site == "youtube" and r.kind == "channel" and channel_tab(r) in (None, "featured"):
+        return r.url.removesuffix("/featured") + "/videos"
+    return url
+
+def find_subscription(subs, url):
+    key = router.canonical_key(source_url(url))
+    return next((sub for sub in subs if router.canonical_key(source_url(sub.url)) == key), None)
+
+def is_newest_first(url):
+    """Channel upload tabs list newest-first; playlists and SVT series don't."""
+    r = router.route(source_url(url))
+    return bool(r and r.site == "youtube" and r.kind == "channel" and channel_tab(r) in NEWEST_FIRST_TABS)
+
+def folder_name(title):
+    return re.sub(r'[\\/:*?"<>|]+', "_", title).strip(" .") or "subscription"
+
+async def subscribe(url, output_dir=None, mode="video", profile=None, skip_existing=False, timeout=None):
+    """
+    Add (or update) a subscription. The source is listed once to learn its
+    title; with skip_existing its current items count as already downloaded.
+    Returns (subscription, error).
+    """
+    url = source_url(url)
+    entries, res = await api.list_entries(url, timeout=timeout)
+    if entries is None:
+        return None, (api.last_error(res.stderr) if res else None) or "Could not list the link."
+
+    title = next((e.get("playlist_title") for e in entries if e.get("playlist_title")), None) or url
+    subs = await asyncio.to_thread(load_subscriptions)
+    sub = find_subscription(subs, url)
+    if sub is None:
+        sub = Subscription(url=url)
+        subs.append(sub)
+
+    sub.url = url
+    sub.newest_first = is_newest_first(url)
+    sub.title = title
+    sub.mode = mode
+    sub.profile = profile
+    sub.output_dir = str(output_dir or os.path.join(os.getcwd(), folder_name(title)))
+    if skip_existing:
+        sub.known = list(dict.fromkeys(sub.known + [e["id"] for e in entries if e.get("id")]))
+
+    await asyncio.to_thread(save_subscriptions, subs)
+    return sub, None
+
+def unsubscribe(url):
+    """Remove a subscription. Returns True if it existed."""
+    subs = load_subscriptions()
+    key = router.canonical_key(source_url(url))
+    remaining = [sub for sub in subs if router.canonical_key(source_url(sub.url)) != key]
+    if len(remaining) == len(subs):
+        return False
+    save_subscriptions(remaining)
+    return True
+
+async def sync_one(sub, listings=None, downloads=None, dry_run=False, timeout=None, on_item=None, **kwargs):
+    """
+    List sub until its known items and download the new ones (oldest first).
+    listings/downloads are semaphores shared between subscriptions that bound
+    concurrent listings and downloads (default: one at a time).
+    Successfully downloaded ids are added to sub.known, failed ones to
+    sub.pending, which are downloaded again (oldest first) on the next sync.
+    """
+    listings = listings or asyncio.Semaphore(1)
+    downloads = downloads or asyncio.Semaphore(1)
+    start = time.monotonic()
+    result = SyncResult(url=sub.url, title=sub.title)
+    known = set(sub.known)
+    streak = 0
+    needed = min(KNOWN_STREAK, len(known))
+
+    def stop(entry):
+        nonlocal streak
+        streak = streak + 1 if entry.get("id") in known else 0
+        return bool(sub.newest_first and needed and streak >= needed)
+
+    async with listings:
+        # source_url also fixes tabless channels subscribed before it existed
+        entries, res = await api.list_entries(source_url(sub.url), stop=stop, timeout=timeout)
+    if entries is None:
+        result.error = (api.last_error(res.stderr) if res else None) or "Could not list the link."
+        result.elapsed = round(time.monotonic() - start, 3)
+        return result
+
+    result.listed = len(entries)
+    result.stopped_early = res.stopped
+    pending = {p["id"]: p for p in sub.pending if p.get("id") and p.get("url") and p["id"] not in known}
+    new = {e["id"]: e for e in entries
+           if e.get("id") and e.get("url") and e["id"] not in known and e["id"] not in pending}
+    fresh = list(new.values())
+    if sub.newest_first:
+        fresh.reverse()
+    items = list(pending.values()) + fresh
+    result.new = [e["id"] for e in fresh]
+    result.retried = list(pending)
+
+    async def one(entry):
+        async with metrics.slot(downloads, "sync"):
+            r = await api.download(entry["url"], sub.output_dir, sub.mode, profile=sub.profile,
+                                   timeout=timeout, **kwargs)
+        record = next((p for p in sub.pending if p.get("id") == entry["id"]), None)
+        if r.ok:
+            sub.known.append(entry["id"])
+            if record:
+                sub.pending.remove(record)
+        elif record:
+            record["attempts"] = int(record.get("attempts", 1)) + 1
+            if record["attempts"] >= RETRY_LIMIT:
+                sub.pending.remove(record)
+                result.given_up.append(entry["id"])
+        else:
+            sub.pending.append({"id": entry["id"], "url": entry["url"], "title": entry.get("title"),
+                                "attempts": 1})
+        if on_item: on_item(sub, entry, r)
+        return r
+
+    if not dry_run:
+        result.downloads = list(await asyncio.gather(*(one(e) for e in items)))
+        sub.last_sync = datetime.now().isoformat(timespec="seconds")
+
+    result.ok = all(r.ok for r in result.downloads)
+    if not result.ok:
+        result.error = f"{sum(1 for r in result.downloads if not r.ok)} of {len(items)} downloads failed"
+    result.elapsed = round(time.monotonic() - start, 3)
+    return result
+
+async def sync_all(subs=None, jobs=2, dry_run=False, timeout=None, on_result=None, on_item=None, **kwargs):
+    """
+    Sync every subscription concurrently. Listings and downloads are each
+    limited to `jobs` at once across all subscriptions, and the subscription
+    file is saved as each one finishes.
+    Returns a SyncResult per subscription.
+    """
+    subs = subs if subs is not None else await asyncio.to_thread(load_subscriptions)
+    listings = asyncio.Semaphore(max(1, int(jobs or 1)))
+    downloads = asyncio.Semaphore(max(1, int(jobs or 1)))
+    save_lock = asyncio.Lock()
+
+    async def one(sub):
+        result = await sync_one(sub, listings, downloads, dry_run=dry_run, timeout=timeout,
+                                on_item=on_item, **kwargs)
+        if not dry_run:
+            # Snapshot here, other syncs keep appending to their known lists
+            snapshot = [replace(s, known=list(s.known), pending=[dict(p) for p in s.pending]) for s in subs]
+            async with save_lock:
+                await asyncio.to_thread(save_subscriptions, snapshot)
+        if on_result: on_result(sub, result)
+        return result
+
+    return list(await asyncio.gather(*(one(sub) for sub in subs)))
@@ -6,6 +6,7 @@ from rich.console import Console
 from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
 from InquirerPy.separator import Separator
+from src import router
 
 console = Console()
 
@@ -85,6 +86,42 @@ def gum_choose(choices, header=None):
 
     return prompt.execute()
 
+def human_size(num):
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if num < 1024 or unit == "GiB":
+            return f"{num:.1f}{unit}"
+        num /= 1024
+
+def gum_progress(progress):
+    """Render an api.Progress update on a single, rewritten console line."""
+    if not console.file.isatty():
+        return # Redrawn lines would only litter logs and pipes
+    if progress.status == "finished":
+        console.file.write("\r\033[K")
+        console.file.flush()
+        return
+
+    percent = progress.percent
+    if progress.url and router.site_for(progress.url) == "svtplay":
+        # svtplay-dl reports segments, not bytes
+        line = f"  {percent or 0:5.1f}%  segment {progress.downloaded_bytes}/{progress.total_bytes}"
+    else:
+        line = f"  {percent or 0:5.1f}%"
+        if progress.total_bytes:
+            line += f" of {human_size(progress.total_bytes)}"
+        if progress.speed:
+            line += f" at {human_size(progress.speed)}/s"
+        if progress.eta:
+            line += f"  ETA {progress.eta // 60:02d}:{progress.eta % 60:02d}"
+    console.file.write(f"\r\033[K{line}")
+    console.file.flush()
+
+def gum_output(line, stream=None):
+    """Echo tool output that isn't progress, dimmed."""
+    if console.file.isatty():
+        console.file.write("\r\033[K")
+    rprint(Text(line, style="color(240)"))
+
 # Deprecated/Unused but kept for interface compatibility if needed
 def gum_table(csv_data, header):
     pass
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Conditional, verified tool updates.
+
+yt-dlp is only downloaded when the published release differs from the
+installed binary. Requests carry the ETag/Last-Modified from the previous run
+so unchanged releases cost a 304, the binary is streamed to a temp file next
+to the destination while its SHA-256 is computed, checked against the
+release's SHA2-256SUMS and then swapped in with an atomic rename.
+
+The download locations can be pointed at a local HTTP server with the
+QUICKTUBE_YTDLP_BASE and QUICKTUBE_SVTPLAY_URL environment variables.
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import platform
+import tempfile
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+from src.utils import run_command, write_log
+from src.api import Progress
+import src.config as config
+
+YTDLP_RELEASE_BASE = os.environ.get(
+    "QUICKTUBE_YTDLP_BASE", "https://github.com/yt-dlp/yt-dlp/releases/latest/download"
+)
+SVTPLAY_DL_URL = os.environ.get("QUICKTUBE_SVTPLAY_URL", "https://svtplay-dl.se/download/svtplay-dl.exe")
+CHECKSUM_FILE = "SHA2-256SUMS"
+STATE_FILE = "update_state.json"
+CHUNK_SIZE = 256 * 1024
+HTTP_TIMEOUT = 30
+
+
+@dataclass
+class UpdateResult:
+    tool: str
+    status: str = "failed"         # updated, up-to-date, available, failed
+    path: str = None
+    installed_version: str = None
+    latest_version: str = None
+    bytes: int = 0
+    verified: bool = False
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.status != "failed"
+
+
+def get_state_path():
+    return os.path.join(config.get_user_config_dir(), STATE_FILE)
+
+def load_state():
+    try:
+        with open(get_state_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+def save_state(state):
+    path = get_state_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+    except OSError:
+        pass # Fail silently, next run just won't be conditional
+
+def http_get(url, state=None, conditional=True):
+    """
+    GET url, sending the validators remembered in state["http"][url].
+    Returns the open response, or None on 304 Not Modified.
+    """
+    request = urllib.request.Request(url, headers={"User-Agent": "QuickTube-updater"})
+    cached = (state or {}).get("http", {}).get(url, {})
+    if conditional:
+        if cached.get("etag"):
+            request.add_header("If-None-Match", cached["etag"])
+        if cached.get("last_modified"):
+            request.add_header("If-Modified-Since", cached["last_modified"])
+    try:
+        return urllib.request.urlopen(request, timeout=HTTP_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+
+def remember_validators(state, url, response):
+    state.setdefault("http", {})[url] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+def release_version(response):
+    """GitHub's latest/download redirects to /releases/download/<tag>/..."""
+    match = re.search(r"/releases/download/([^/]+)/", response.geturl())
+    return match.group(1) if match else None
+
+def parse_checksums(text):
+    sums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and re.fullmatch(r"[0-9a-fA-F]{64}", parts[0]):
+            sums[parts[1].lstrip("*")] = parts[0].lower()
+    return sums
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def installed_version(path):
+    if not path or not os.path.exists(path):
+        return None
+    res = run_command([path, "--version"])
+    if not res or res.returncode != 0:
+        return None
+    return res.stdout.strip().splitlines()[0] if res.stdout.strip() else None
+
+def stream_to_file(response, dest_dir, progress=None, url=None):
+    """
+    Stream a response into a temp file in dest_dir (same filesystem as the
+    final binary, so the swap can be a rename). Returns (path, sha256, size).
+    """
+    total = int(response.headers.get("Content-Length") or 0)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix=".update-", dir=dest_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if progress:
+                    progress(Progress(url=url, status="downloading", downloaded_bytes=size, total_bytes=total))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    finally:
+        response.close()
+    if progress:
+        progress(Progress(url=url, status="finished", downloaded_bytes=size, total_bytes=total))
+    return tmp_path, digest.hexdigest(), size
+
+def install(tmp_path, dest):
+    """Make the new binary executable and atomically swap it in."""
+    if platform.system() != "Windows":
+        os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, dest)
+
+def ytdlp_asset_name(system=None):
+    system = system or platform.system()
+    if system == "Windows": return "yt-dlp.exe"
+    if system == "Darwin": return "yt-dlp_macos"
+    return "yt-dlp"
+
+def update_ytdlp(bin_dir, progress=None, check_only=False):
+    """Bring the yt-dlp binary in bin_dir up to date. Returns an UpdateResult."""
+    system = platform.system()
+    asset = ytdlp_asset_name(system)
+    dest = os.path.join(bin_dir, "yt-dlp.exe" if system == "Windows" else "yt-dlp")
+    result = UpdateResult(tool="yt-dlp", path=dest)
+    state = load_state()
+    saved = state.get("yt-dlp", {})
+
+    # The one we manage, or whatever is on PATH if we haven't installed one yet
+    result.installed_version = installed_version(dest) or installed_version(shutil.which("yt-dlp"))
+
+    sums_url = f"{YTDLP_RELEASE_BASE}/{CHECKSUM_FILE}"
+    asset_url = f"{YTDLP_RELEASE_BASE}/{asset}"
+    try:
+        response = http_get(sums_url, state)
+        if response is None:
+            # Release unchanged since our last successful run
+            result.latest_version = saved.get("version")
+            if saved.get("sha256") and sha256_file(dest) == saved["sha256"]:
+                result.status = "up-to-date"
+                result.verified = True
+                return result
+            response = http_get(sums_url, state, conditional=False)
+
+        with response:
+            result.latest_version = release_version(response)
+            expected = parse_checksums(response.read().decode("utf-8", errors="replace")).get(asset)
+            remember_validators(state, sums_url, response)
+
+        if not expected:
+            result.error = f"No checksum published for {asset}"
+            return result
+
+        if sha256_file(dest) == expected:
+            result.status = "up-to-date"
+            result.verified = True
+        elif not os.path.exists(dest) and result.latest_version and result.installed_version == result.latest_version:
+            # The yt-dlp on PATH is already the latest release
+            result.status = "up-to-date"
+
+        if result.status == "up-to-date":
+            if result.verified:
+                state["yt-dlp"] = {"sha256": expected, "version": result.latest_version}
+            save_state(state)
+            return result
+
+        if check_only:
+            result.status = "available"
+            return result
+
+        os.makedirs(bin_dir, exist_ok=True)
+        response = http_get(asset_url, state, conditional=False)
+        tmp_path, digest, result.bytes = stream_to_file(response, bin_dir, progress, url=asset_url)
+        if digest != expected:
+            os.remove(tmp_path)
+            result.error = f"Checksum mismatch for {asset} (expected {expected}, got {digest})"
+            return result
+
+        install(tmp_path, dest)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        result.error = str(e)
+        write_log(f"yt-dlp update failed: {e}", console=False)
+        return result
+
+    result.status = "updated"
+    result.verified = True
+    result.installed_version = installed_version(dest) or result.latest_version
+    state["yt-dlp"] = {"sha256": expected, "version": result.latest_version}
+    save_state(state)
+    write_log(f"yt-dlp updated to {result.installed_version} ({result.bytes} bytes)", console=False)
+    return result
+
+def update_svtplay_windows(bin_dir, progress=None, check_only=False):
+    """
+    Update the standalone svtplay-dl.exe. The site publishes no checksums, so
+    only the conditional request protects against re-downloading.
+    """
+    dest = os.path.join(bin_dir, "svtplay-dl.exe")
+    result = UpdateResult(tool="svtplay-dl", path=dest, installed_version=installed_version(dest))
+    state = load_state()
+    try:
+        # Only conditional if the file we downloaded last time is still there
+        response = http_get(SVTPLAY_DL_URL, state, conditional=os.path.exists(dest))
+        if response is None:
+            result.status = "up-to-date"
+            return result
+        if check_only:
+            response.close()
+            result.status = "available"
+            return result
+
+        os.makedirs(bin_dir, exist_ok=True)
+        remember_validators(state, SVTPLAY_DL_URL, response)
+        tmp_path, _, result.bytes = stream_to_file(response, bin_dir, progress, url=SVTPLAY_DL_URL)
+        install(tmp_path, dest)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        result.error = str(e)
+        write_log(f"svtplay-dl update failed: {e}", console=False)
+        return result
+
+    result.status = "updated"
+    result.installed_version = installed_version(dest)
+    save_state(state)
+    return result
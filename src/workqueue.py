@@ -0,0 +1,386 @@
+"""
+Shared batch work queue.
+
+Several QuickTube workers, on one host or many, can work through the same
+links file when they share a work directory (by default a hidden folder in
+the batch output folder, e.g. on a NAS). A link is claimed by creating its
+lease file exclusively (O_EXCL), so exactly one worker gets it. The owner
+renews the lease while the download runs; when a worker dies its leases
+expire and the remaining workers take those links over. Hosts therefore
+need roughly synchronised clocks (NTP) and the lease should be much longer
+than the renew interval (a third of it).
+
+    <work dir>/leases/<key>.json   claimed: worker, url, expiry
+    <work dir>/done/<key>.json     finished: worker, files
+    <work dir>/failed/<key>.json   failed attempts, retried by any worker
+                                   until max_attempts
+
+Finished files go into the shared output folder without ever replacing an
+existing file (see storage.publish_new), so two workers can't clobber each
+other's downloads.
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import secrets
+from contextlib import contextmanager
+from datetime import datetime
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src import api
+from src import router
+from src import metrics
+
+WORK_DIR_NAME = ".quicktube-work"
+LEASE_TTL = 120         # seconds a claim is valid without renewal
+MAX_ATTEMPTS = 3        # failed downloads of a link before it is given up
+STEAL_TIMEOUT = 30      # a takeover lock older than this belongs to a dead worker
+
+
+@dataclass
+class QueueStatus:
+    total: int = 0
+    done: int = 0
+    failed: int = 0      # given up after max_attempts
+    claimed: int = 0     # held by a live lease
+    pending: int = 0
+
+    @property
+    def finished(self):
+        return self.done + self.failed == self.total
+
+
+@dataclass
+class WorkerResult:
+    worker: str
+    results: list = field(default_factory=list)  # api.DownloadResult per link this worker ran
+    taken_over: int = 0                          # expired leases of other workers reclaimed
+    lost: int = 0                                # own leases that expired while downloading
+    status: QueueStatus = None
+
+
+def default_work_dir(output_dir):
+    return Path(output_dir) / WORK_DIR_NAME
+
+def make_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(2)}"
+
+def link_key(url):
+    """File name for a link: equivalent links (see router) share it."""
+    return hashlib.sha1(router.canonical_key(url).encode("utf-8")).hexdigest()[:20]
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def _write_json(path, data):
+    """Replace path atomically, readers on other hosts never see half a file."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _create_json(path, data):
+    """Create path only if it doesn't exist. Returns False if someone else did."""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return True
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+@contextmanager
+def _locked(lock, worker_id):
+    """
+    Hold the lock file `lock` while the block runs. Yields False if another
+    worker holds it (a lock older than STEAL_TIMEOUT is removed for the next try).
+    """
+    if not _create_json(lock, {"worker": worker_id}):
+        try:
+            if time.time() - os.path.getmtime(lock) > STEAL_TIMEOUT:
+                _remove(lock)
+        except OSError:
+            pass
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        _remove(lock)
+
+
+class WorkQueue:
+    """Claims on the links of one batch, backed by files in work_dir."""
+
+    def __init__(self, work_dir, worker_id=None, lease_ttl=LEASE_TTL, max_attempts=MAX_ATTEMPTS):
+        self.work_dir = Path(work_dir)
+        self.worker_id = worker_id or make_worker_id()
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        self.tokens = {}    # url -> token of the lease we hold
+        self.leases = self.work_dir / "leases"
+        self.done = self.work_dir / "done"
+        self.failed = self.work_dir / "failed"
+        for d in (self.leases, self.done, self.failed):
+            d.mkdir(parents=True, exist_ok=True)
+
+    def _lease_path(self, url):
+        return self.leases / f"{link_key(url)}.json"
+
+    def _lock(self, url):
+        # Every change to an existing lease happens under this lock, so a
+        # renew or release can't overwrite a lease another worker took over
+        return _locked(self._lease_path(url).with_suffix(".takeover"), self.worker_id)
+
+    def _lease_expiry(self, path):
+        """Expiry of a lease file, None if there is none."""
+        lease = _read_json(path)
+        if lease and isinstance(lease.get("expires"), (int, float)):
+            return lease["expires"]
+        # Unreadable: written by a worker that died mid-create, or being replaced
+        try:
+            return os.path.getmtime(path) + self.lease_ttl
+        except OSError:
+            return None
+
+    def _lease(self, url, attempt):
+        return {
+            "worker": self.worker_id,
+            "url": url,
+            "token": secrets.token_hex(8),
+            "attempt": attempt,
+            "claimed": datetime.now().isoformat(timespec="seconds"),
+            "expires": time.time() + self.lease_ttl,
+        }
+
+    def attempts(self, url):
+        record = _read_json(self.failed / f"{link_key(url)}.json")
+        return int(record.get("attempts", 0)) if record else 0
+
+    def is_done(self, url):
+        return (self.done / f"{link_key(url)}.json").exists()
+
+    def is_given_up(self, url):
+        return self.attempts(url) >= self.max_attempts
+
+    def claim(self, url):
+        """
+        Try to become the worker for url. Returns "claimed", "taken_over"
+        (an expired lease was reclaimed) or None.
+        """
+        if self.is_done(url) or self.is_given_up(url):
+            return None
+        path = self._lease_path(url)
+        lease = self._lease(url, self.attempts(url) + 1)
+        if _create_json(path, lease):
+            # Finished between the check and the claim
+            if self.is_done(url):
+                _remove(path)
+                return None
+            self.tokens[url] = lease["token"]
+            return "claimed"
+
+        expires = self._lease_expiry(path)
+        if expires is not None and expires > time.time():
+            return None
+        return "taken_over" if self._take_over(url, path, lease) else None
+
+    def _take_over(self, url, path, lease):
+        # Only one worker may remove an expired lease, or a second one could
+        # remove the fresh lease the first just created
+        with self._lock(url) as locked:
+            if not locked:
+                return False
+            expires = self._lease_expiry(path)
+            if expires is not None and expires > time.time():
+                return False
+            _remove(path)
+            if not _create_json(path, lease):
+                return False
+            if self.is_done(url):
+                _remove(path)
+                return False
+            self.tokens[url] = lease["token"]
+            return True
+
+    def _owns(self, lease, url):
+        return bool(lease) and lease.get("token") == self.tokens.get(url)
+
+    def renew(self, url):
+        """
+        Extend our lease. Returns False if it was lost to another worker and
+        None if that couldn't be checked right now (lock busy, try again).
+        """
+        path = self._lease_path(url)
+        with self._lock(url) as locked:
+            if not locked:
+                return None
+            lease = _read_json(path)
+            if not self._owns(lease, url):
+                return False
+            lease["expires"] = time.time() + self.lease_ttl
+            try:
+                _write_json(path, lease)
+            except OSError:
+                return None
+            return True
+
+    def release(self, url):
+        """Drop our lease (if it is still ours)."""
+        path = self._lease_path(url)
+        for _ in range(20):
+            with self._lock(url) as locked:
+                if locked:
+                    if self._owns(_read_json(path), url):
+                        _remove(path)
+                    break
+            time.sleep(0.05)
+        self.tokens.pop(url, None)
+
+    def complete(self, url, result, output_dir):
+        files = []
+        for f in result.files:
+            try:
+                files.append(os.path.relpath(f.path, output_dir))
+            except ValueError: # other drive on Windows
+                files.append(f.path)
+        _write_json(self.done / f"{link_key(url)}.json", {
+            "url": url,
+            "worker": self.worker_id,
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "elapsed": result.elapsed,
+            "files": files,
+        })
+        _remove(self.failed / f"{link_key(url)}.json")
+        self.release(url)
+
+    def fail(self, url, result):
+        path = self.failed / f"{link_key(url)}.json"
+        record = _read_json(path) or {"url": url, "attempts": 0, "errors": []}
+        record["attempts"] = int(record.get("attempts", 0)) + 1
+        errors = (record.get("errors") or []) + [{"worker": self.worker_id, "error": result.error}]
+        record["errors"] = errors[-self.max_attempts:]
+        _write_json(path, record)
+        self.release(url)
+
+    def status(self, urls):
+        status = QueueStatus(total=len(urls))
+        now = time.time()
+        for url in urls:
+            if self.is_done(url):
+                status.done += 1
+            elif self.is_given_up(url):
+                status.failed += 1
+            else:
+                expires = self._lease_expiry(self._lease_path(url))
+                if expires is not None and expires > now:
+                    status.claimed += 1
+                else:
+                    status.pending += 1
+        return status
+
+
+async def run_worker(links, output_dir, mode="video", quality=None, jobs=1, work_dir=None,
+                     worker_id=None, lease_ttl=LEASE_TTL, max_attempts=MAX_ATTEMPTS, poll=None,
+                     on_start=None, on_result=None, **kwargs):
+    """
+    Work on a batch shared with other workers until every link is done or
+    given up. Up to `jobs` links are claimed at a time; links held by other
+    workers are waited for and taken over if their lease expires.
+    on_start(url) / on_result(url, DownloadResult) are called for links this
+    worker runs. Other arguments are passed to api.download.
+    Returns a WorkerResult.
+    """
+    links, _ = router.dedupe(links)
+    queue = await asyncio.to_thread(WorkQueue, work_dir or default_work_dir(output_dir), worker_id,
+                                    lease_ttl, max_attempts)
+    worker = WorkerResult(worker=queue.worker_id)
+    poll = poll or min(5.0, lease_ttl / 4)
+    slots = asyncio.Semaphore(max(1, int(jobs or 1)))
+    running = {}    # url -> download task, until the task has ended
+    lost = set()    # running urls whose lease another worker took over
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(lease_ttl / 3)
+            for url, task in list(running.items()):
+                if url not in lost and await asyncio.to_thread(queue.renew, url) is False:
+                    # Someone else downloads it now, stop ours. The url stays
+                    # in running until the download has really stopped.
+                    worker.lost += 1
+                    lost.add(url)
+                    task.cancel()
+
+    async def one(url):
+        try:
+            if on_start: on_start(url)
+            result = await api.download(url, output_dir, mode, quality=quality, overwrite=False, **kwargs)
+            if result.ok:
+                await asyncio.to_thread(queue.complete, url, result, output_dir)
+            else:
+                await asyncio.to_thread(queue.fail, url, result)
+            worker.results.append(result)
+            if on_result: on_result(url, result)
+        except asyncio.CancelledError:
+            if url not in lost:
+                raise
+        finally:
+            running.pop(url, None)
+            lost.discard(url)
+            slots.release()
+
+    beat = asyncio.create_task(heartbeat())
+    tasks = set()
+    try:
+        while True:
+            claimed_any = False
+            for url in links:
+                if url in running:
+                    continue
+                await slots.acquire()
+                claim = await asyncio.to_thread(queue.claim, url)
+                if not claim:
+                    slots.release()
+                    continue
+                claimed_any = True
+                if claim == "taken_over":
+                    worker.taken_over += 1
+                task = asyncio.create_task(one(url))
+                running[url] = task
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            status = await asyncio.to_thread(queue.status, links)
+            metrics.QUEUE_DEPTH.set(status.pending, queue="shared")
+            if status.finished and not running:
+                break
+            if not claimed_any:
+                # Everything left is running here or held by other workers
+                await asyncio.sleep(poll)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        beat.cancel()
+        for task in tasks:
+            task.cancel()
+        for url in list(running):
+            await asyncio.to_thread(queue.release, url)
+
+    worker.status = await asyncio.to_thread(queue.status, links)
+    return worker